@@ -3,22 +3,42 @@
 This module backs up the 5 main Salesforce tables and saves to CSV
 '''
 from botutils.ADB import ssf
-from botutils.tabletools import tabletools as tt
+from botutils.ADB import ssfBackup
 import botutils.fileutils.zipup as zipup #for compressing the output
+import argparse
 import datetime
 import os
+import time
+
+parser = argparse.ArgumentParser(description='Backs up main Salesforce tables')
+bulk_help = 'Export each table with a Bulk API query job (faster for big tables)'
+parser.add_argument('-bulk', dest='bulk', action='store_true', help=bulk_help)
+obj_help = 'Objects to back up (default: Contact Account Enrollment__c)'
+parser.add_argument('-objects', dest='objects', nargs='+', help=obj_help,
+        default=['Contact',
+                 'Account',
+                 'Enrollment__c',
+                 #'Contact_Note__c',
+                 ])
+inc_help = ('Only download records changed since the last run and merge them '+
+            'into the snapshots kept in -statedir')
+parser.add_argument('-incremental', dest='incremental', action='store_true',
+        help=inc_help)
+parser.add_argument('-statedir', dest='statedir', default='backup_state',
+        help='Folder for the incremental watermarks and snapshots')
+parser.add_argument('-fullevery', dest='fullevery', type=int, default=7,
+        help='Days between full snapshots in incremental mode (default 7)')
+args = parser.parse_args()
 
 ends =datetime.datetime.now().strftime('%m_%d_%Y')
 os.mkdir(ends)
 sf = ssf.getSF()
-objects = ['Contact',
-           'Account',
-           'Enrollment__c',
-           #'Contact_Note__c',
-           ]
-for obj in objects:
-    exec('oj = sf.' + obj)
-    table = ssf.getAll(sf, oj)
-    tt.table_to_csv(ends+'/'+obj+'_'+ends+'.csv', table)
+
+# Objects are fetched at the same time, each streaming to its own CSV file
+start = time.perf_counter()
+results = ssfBackup.backup_objects(sf, args.objects, ends, ends, args.bulk,
+        state_dir=args.statedir if args.incremental else None,
+        full_every=args.fullevery)
+ssfBackup.print_throughput(results, time.perf_counter() - start)
 
 zipup.compress(ends) #Compresses the output directory into a single zip file
@@ -8,64 +8,146 @@ from botutils.ADB import ContactNamespace as c
 from botutils.ADB import AccountNamespace as a
 from botutils.ADB import EnrollmentNamespace as e
 from botutils.tabletools import tabletools as tt
+from botutils.timeutils import stagetimer
 from botutils.ADB import ssf
 
-#Grab the data tables
-restriction = ''
-sf = ssf.getSF()
-contacts, accounts, enrollments = aDBi.grabThreeMainTables_Analysis(
-                                                    restriction,sf)
+def get_attending_by_student(enrollments, dE):
+    '''
+    Returns a dict of student Id: list of that student's Attending
+    enrollments (in table order)
+    '''
+    attending = {}
+    for row in enrollments:
+        if row[dE[e.Status__c]] == 'Attending':
+            attending.setdefault(row[dE[e.Student__c]], []).append(row)
+    return attending
 
-#Lop off headers
-dC = tt.slice_header(contacts)
-dA = tt.slice_header(accounts)
-dE = tt.slice_header(enrollments)
+def recompute_enrolled_at(contacts, dC, enrollments, dE, accounts, dA):
+    '''
+    Appends the Attending enrollment count, the recomputed Currently
+    Enrolled At value and CHANGE/NO CHANGE to each contact row and returns
+    a list of (Id, fields) updates for the contacts that changed
+    '''
+    attending = get_attending_by_student(enrollments, dE)
+    names = tt.create_dict(accounts, dA[a.Id], dA[a.Name])
+    updates = []
+    soFar = 0 #index of number of contacts covered
+    for student in contacts:
+        soFar+=1
+        if not soFar % 10: print('.', end='')
+        if not soFar % 100: print('%d contacts processed.' % soFar)
+        records = attending.get(student[dC[c.Id]], [])
+        schools = [names[record[dE[e.College__c]]] for record in records
+                                        if record[dE[e.College__c]] in names]
+        enrolled_at = '; '.join(schools) if schools else None
+        student.append(len(records))
+        student.append(enrolled_at)
+        if enrolled_at == student[dC[c.Currently_Enrolled_At__c]]:
+            student.append('NO CHANGE')
+        else:
+            student.append('CHANGE')
+            updates.append((student[dC[c.Id]],
+                            {c.Currently_Enrolled_At__c: enrolled_at}))
+    print('')
+    return updates
 
-print('Beginning to parse %d contacts.' % len(contacts))
-soFar = 0 #index of number of contacts covered
-for student in contacts:
-    soFar+=1
-    if not soFar % 10: print('.', end='')
-    if not soFar % 100: print('%d contacts processed.' % soFar)
-    records = [row for row in enrollments if row[dE[e.Student__c]] ==
-                                                  student[dC[c.Id]] and
-                                                  row[dE[e.Status__c]] ==
-                                                  'Attending']
+def write_diff(fn, contacts, dC):
+    '''Saves the contacts whose Currently Enrolled At will change'''
+    diff = [[c.Id, c.LastName, c.FirstName, 'OldEnrolledAt',
+             'NewEnrolledAt']]
+    for student in contacts:
+        if student[dC['EnrollChangeStatus']] == 'CHANGE':
+            diff.append([student[dC[c.Id]], student[dC[c.LastName]],
+                         student[dC[c.FirstName]],
+                         student[dC[c.Currently_Enrolled_At__c]],
+                         student[dC['NewEnrolledAt']]])
+    tt.table_to_csv(fn, diff)
+    return len(diff) - 1
 
-    enrolled_at = None
-    for record in records:
-        matchcols = [sch for sch in accounts if sch[dA[a.Id]] ==
-                                                record[dE[e.College__c]]]
-        for school in matchcols:
-            if enrolled_at:
-                enrolled_at += '; ' + school[dA[a.Name]]
-            else:
-                enrolled_at = school[dA[a.Name]]
-    student.append(len(records))
-    student.append(enrolled_at)
-    if enrolled_at == student[dC[c.Currently_Enrolled_At__c]]:
-        student.append('NO CHANGE')
-    else:
-        student.append('CHANGE')
-        sf.Contact.update(student[dC[c.Id]],
-                          {c.Currently_Enrolled_At__c: enrolled_at})
-dC['EnrollmentCount']=max(dC.values())+1
-dC['NewEnrolledAt']=max(dC.values())+1
-dC['EnrollChangeStatus']=max(dC.values())+1
+def write_report(fn, contacts, accounts, enrollments):
+    '''Writes all three tables (with headers) to an Excel file'''
+    import xlsxwriter
+    workbook = xlsxwriter.Workbook(fn)
+    ws =tt.table_to_exsheet(workbook, 'Contacts', contacts, bold=True,
+                            space=True)
+    ws.freeze_panes(1,3)
+    ws = tt.table_to_exsheet(workbook, 'Accounts', accounts, bold=True,
+                             space=True)
+    ws.freeze_panes(1,2)
+    ws = tt.table_to_exsheet(workbook, 'Enrollments', enrollments,
+                             bold=True, space=True)
+    ws.freeze_panes(1,3)
+    workbook.close()
 
-#Reconstitute headers
-tt.add_header(contacts, dC)
-tt.add_header(accounts, dA)
-tt.add_header(enrollments, dE)
+def main(cache=False, refresh=False, dryrun=False, full=False):
+    '''Main control flow for fixing Currently Enrolled At'''
+    timer = stagetimer.StageTimer()
 
-#Now write everything to the file
-import xlsxwriter
-workbook = xlsxwriter.Workbook('FixCurrentlyEnrolledAtReport.xlsx')
-ws =tt.table_to_exsheet(workbook, 'Contacts', contacts, bold=True, space=True)
-ws.freeze_panes(1,3)
-ws = tt.table_to_exsheet(workbook, 'Accounts', accounts, bold=True, space=True)
-ws.freeze_panes(1,2)
-ws = tt.table_to_exsheet(workbook, 'Enrollments', enrollments,
-                         bold=True, space=True)
-ws.freeze_panes(1,3)
-workbook.close()
+    #Grab the data tables
+    restriction = ''
+    sf = ssf.getSF()
+    if cache or refresh:
+        contacts, accounts, enrollments = aDBi.grabThreeMainTables_Cached(
+                                            restriction, sf, refresh=refresh)
+    elif full:
+        contacts, accounts, enrollments = aDBi.grabThreeMainTables_Analysis(
+                                                        restriction,sf)
+    else: # only the rows that can affect Currently Enrolled At
+        contacts, accounts, enrollments = aDBi.grabEnrolledAtTables_Planned(sf)
+    timer.lap('Load tables')
+
+    #Lop off headers
+    dC = tt.slice_header(contacts)
+    dA = tt.slice_header(accounts)
+    dE = tt.slice_header(enrollments)
+
+    print('Beginning to parse %d contacts.' % len(contacts))
+    updates = recompute_enrolled_at(contacts, dC, enrollments, dE,
+                                    accounts, dA)
+    dC['EnrollmentCount']=max(dC.values())+1
+    dC['NewEnrolledAt']=max(dC.values())+1
+    dC['EnrollChangeStatus']=max(dC.values())+1
+    timer.lap('Recompute Currently Enrolled At')
+
+    changed = write_diff('FixCurrentlyEnrolledAtDiff.csv', contacts, dC)
+    print('%d contacts to change (see FixCurrentlyEnrolledAtDiff.csv).' %
+            changed)
+    timer.lap('Write diff')
+
+    if not dryrun:
+        print('Sending %d updates to Salesforce.' % len(updates))
+        results = ssf.updateCollection(sf, 'Contact', updates)
+        tt.table_to_csv('FixCurrentlyEnrolledAtResults.csv', results)
+        print('%d updates failed (see FixCurrentlyEnrolledAtResults.csv).' %
+                len([x for x in results[1:] if not x[1]]))
+        timer.lap('Update Salesforce')
+
+        #Reconstitute headers
+        tt.add_header(contacts, dC)
+        tt.add_header(accounts, dA)
+        tt.add_header(enrollments, dE)
+
+        #Now write everything to the file
+        write_report('FixCurrentlyEnrolledAtReport.xlsx', contacts, accounts,
+                     enrollments)
+        timer.lap('Write report')
+    timer.report()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Fixes Currently Enrolled At')
+    cache_help = 'Use a recent local snapshot of the database tables'
+    parser.add_argument('-cache', dest='cache', action='store_true',
+            help=cache_help)
+    refresh_help = 'Refresh the local snapshot of the database tables'
+    parser.add_argument('-refresh', dest='refresh', action='store_true',
+            help=refresh_help)
+    dry_help = 'Only write the diff of changes (no updates or report)'
+    parser.add_argument('-dryrun', dest='dryrun', action='store_true',
+            help=dry_help)
+    full_help = 'Pull every contact, account and enrollment for the report'
+    parser.add_argument('-full', dest='full', action='store_true',
+            help=full_help)
+    args = parser.parse_args()
+
+    main(args.cache, args.refresh, args.dryrun, args.full)
@@ -6,6 +6,7 @@ module and let other scripts focus more on the logic of working with
 tables
 '''
 from . import ssf
+from . import snapshotCache
 from . import ContactNamespace as c
 from . import AccountNamespace as a
 from . import EnrollmentNamespace as e
@@ -187,3 +188,79 @@ def grabThreeMainTables_Analysis(contactRestriction='',sf=None,mode='Main'):
     tt.add_header(newAccounts, dA)
     tt.add_header(newEnrollments, dE)
     return (contacts, newAccounts, newEnrollments)
+
+def grabThreeMainTables_Cached(contactRestriction='',sf=None,mode='Main',
+                               refresh=False, ttl=snapshotCache.DEFAULT_TTL):
+    '''
+    Same as grabThreeMainTables_Analysis, but the result is saved to a
+    local snapshot (see snapshotCache) and reused by later calls with the
+    same restriction and mode until it is ttl hours old. If refresh is
+    True, the tables are pulled from Salesforce even if a snapshot exists
+    '''
+    fn = snapshotCache.snapshot_path(mode, contactRestriction)
+    if not refresh:
+        tables = snapshotCache.load_tables(fn, ttl)
+        if tables:
+            return tuple(tables)
+    tables = grabThreeMainTables_Analysis(contactRestriction, sf, mode)
+    snapshotCache.save_tables(fn, tables, contactRestriction)
+    return tables
+
+def _and(*predicates):
+    '''Helper function to combine SOQL predicates (skipping blanks)'''
+    return ' AND '.join(['(' + x + ')' for x in predicates if x])
+
+def _orHeader(table, fields):
+    '''Helper function to give an empty query result its header row'''
+    return table if table else [list(fields)]
+
+def getEnrollmentFields_Attending(sf, restriction=''):
+    '''
+    Get only the Attending enrollments with the name of each college
+    (through the College__r relationship) so accounts needn't be pulled
+    '''
+    fields = [  e.Id,
+                e.Student__c,
+                e.College__c,
+                e.College__r_Name,
+                e.Status__c ]
+    restr = _and(e.Status__c + " = 'Attending'", restriction)
+    return _orHeader(_getEnrollmentFields(sf, fields, restr), fields)
+
+def grabEnrolledAtTables_Planned(sf=None):
+    '''
+    Returns the same (contacts, accounts, enrollments) tuple as
+    grabThreeMainTables_Analysis, but with the filters pushed into SOQL so
+    that only the rows needed to recompute Currently Enrolled At are pulled:
+        enrollments: only Attending ones (with the college name)
+        accounts: built from the college names on those enrollments
+        contacts: only those with Currently Enrolled At filled in or with
+                  an Attending enrollment (every other contact would have
+                  a blank value either way)
+    The contact query takes two calls because SOQL doesn't allow a
+    semi-join (IN subquery) inside an OR
+    '''
+    if not sf: sf = ssf.getSF()
+
+    enrollments = getEnrollmentFields_Attending(sf)
+    dE = tt.slice_header(enrollments)
+    names = {}
+    for row in enrollments:
+        if row[dE[e.College__c]]:
+            names[row[dE[e.College__c]]] = row[dE[e.College__r_Name]]
+    accounts = [[a.Id, a.Name]] + [[k, v] for k, v in names.items()]
+    tt.add_header(enrollments, dE)
+
+    oj = sf.Contact
+    cfields = [c.Id, c.LastName, c.FirstName, c.Currently_Enrolled_At__c]
+    contacts = _orHeader(ssf.getSpecific(sf, oj, cfields,
+                                c.Currently_Enrolled_At__c + ' != null'),
+                         cfields)
+    seen = set([row[0] for row in contacts[1:]])
+    attending = (c.Id + ' IN (SELECT ' + e.Student__c +
+                 " FROM Enrollment__c WHERE " + e.Status__c +
+                 " = 'Attending')")
+    for row in ssf.getSpecific(sf, oj, cfields, attending)[1:]:
+        if row[0] not in seen:
+            contacts.append(row)
+    return (contacts, accounts, enrollments)
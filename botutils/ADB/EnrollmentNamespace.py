@@ -26,3 +26,6 @@ Degree_Text__c = 'Degree_Text__c'
 Major_Text__c = 'Major_Text__c'
 Withdrawal_reason__c = 'Withdrawal_reason__c'
 Withdrawal_code__c = 'Withdrawal_code__c'
+
+# Fields of related records (reached through a lookup relationship)
+College__r_Name = 'College__r.Name'
@@ -0,0 +1,69 @@
+#!python3
+'''
+This module keeps local snapshots of tables pulled from Salesforce so that
+several scripts (or several runs of one script) can share a single pull.
+Each snapshot is a gzipped JSON file that stores every table by column
+(header plus one list of values per column), so the values keep the types
+returned by Salesforce (text, numbers, booleans and nulls).
+Snapshots older than a time to live (TTL) are treated as missing.
+'''
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import sys # for stderr
+
+CACHE_DIR = 'sf_cache'
+DEFAULT_TTL = 12 # hours
+
+def snapshot_path(name, key, cache_dir=CACHE_DIR):
+    '''
+    Returns the filename of the snapshot for name (e.g. 'Main') and key,
+    a string (e.g. a SOQL restriction) hashed to keep the filename short
+    '''
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir, name + '_' + digest + '.json.gz')
+
+def table_to_columns(table):
+    '''Converts a list of lists table (with header) to a column dict'''
+    header = table[0]
+    return {'header': header,
+            'columns': [[row[i] for row in table[1:]]
+                                    for i in range(len(header))]}
+
+def columns_to_table(col_dict):
+    '''Reverse of table_to_columns'''
+    return [list(col_dict['header'])] + [list(row) for row in
+                                         zip(*col_dict['columns'])]
+
+def save_tables(fn, tables, key=''):
+    '''Saves a list of list of lists tables to the snapshot file fn'''
+    os.makedirs(os.path.dirname(fn) or '.', exist_ok=True)
+    snapshot = {'created': datetime.datetime.now().isoformat(),
+                'key': key,
+                'tables': [table_to_columns(table) for table in tables]}
+    temp = fn + '.tmp'
+    with gzip.open(temp, 'wt', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    os.replace(temp, fn) # so a partial write is never read as a snapshot
+    print('Saved snapshot %s' % fn, file=sys.stderr)
+
+def load_tables(fn, ttl=DEFAULT_TTL):
+    '''
+    Returns the list of tables saved in the snapshot file fn or None if the
+    file doesn't exist or is more than ttl hours old
+    '''
+    if not os.path.exists(fn):
+        return None
+    with gzip.open(fn, 'rt', encoding='utf-8') as f:
+        snapshot = json.load(f)
+    created = datetime.datetime.fromisoformat(snapshot['created'])
+    age = datetime.datetime.now() - created
+    if age > datetime.timedelta(hours=ttl):
+        print('Snapshot %s is out of date (created %s)' % (fn,
+                snapshot['created']), file=sys.stderr)
+        return None
+    print('Using snapshot %s (created %s)' % (fn, snapshot['created']),
+            file=sys.stderr)
+    return [columns_to_table(col_dict) for col_dict in snapshot['tables']]
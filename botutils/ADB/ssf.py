@@ -16,15 +16,35 @@ A summary of modules:
     Returns a list of lists based on a SOQL query with the fields as the
     header column in the first list/row
 
+    iterQuery(sf, querytext) --> generator
+    Like getQuery, but yields the header and then each row as the pages
+    of records arrive from Salesforce
+
     getSpecific(sf, obj, fields, restriction='') --> table
     Returns only the specific fields implied by restriction
     
     getAll(sf, sf.Object) --> table
     Returns a list of lists of all of the fields and all of the records
     for a given object
+
+    iterSpecific and iterAll are the generator versions of the above two
+
+    iterBulkQuery(sf, sf.Object, querytext) --> generator
+    Like iterQuery, but runs the query as a Bulk API 2.0 job; getSpecific,
+    getAll, iterSpecific and iterAll all use this if passed bulk=True
+
+    updateCollection(sf, 'Object', updates) --> table
+    Updates records in batches of 200 with the sObject Collections API and
+    returns a table of the results (Id, success flag and errors)
 '''
 from simple_salesforce import Salesforce
+import csv
+import io
 import sys # for stderr
+import time
+
+BULK_CHUNK_SIZE = 50000 # records per downloaded chunk of bulk results
+COLLECTION_SIZE = 200 # most records allowed in one sObject Collections call
 
 def getSF():
     try:
@@ -42,54 +62,189 @@ def getSF():
     sf = Salesforce(username=un, password=pw, security_token=st)
     return sf
 
-def getFields(obj):
+def getFields(obj, skip_compound=False):
     '''
     Takes a Salesforce object name (e.g. Salesforce.Object) as argument
     and then returns all of the field names as a list
     Valid objects include Contact, Account, etc
+    If skip_compound is True, compound address and location fields are
+    left out (the Bulk API can't query them, but it can query their parts)
     '''
     info = obj.describe()['fields']
-    return [x['name'] for x in info]
+    return [x['name'] for x in info if not (skip_compound and
+                                     x['type'] in ('address', 'location'))]
 
-def getQuery(sf, querytext):
+def iterQuery(sf, querytext):
     '''
-    Returns a list of lists based on a SOQL query with the fields as the
-    header column in the first list/row
+    Generator version of getQuery: yields the header (list of fields) first
+    and then one list per record, a page (up to 2,000 records) at a time,
+    so only the current page is ever held in memory
     '''
     gc = sf.query(querytext)
-    # will eventually need to check for empty records
     records = gc['records']
-    print('Reading from %s object' % records[0]['attributes']['type'],
-            file=sys.stderr)
+    if not records: # nothing (not even a header) is yielded for no results
+        return
+    obj_type = records[0]['attributes']['type']
+    print('Reading from %s object' % obj_type, file=sys.stderr)
     heads = list(records[0].keys())[1:] # get the headers (will fail if empty)
-    rt = [ [record[head] for head in heads] for record in records]
-    rt.insert(0,heads) # this is all we need unless the record count is high
-    totalread = len(records) # will be used in the loop
-    while not gc['done']: #will need to keep going if >2,000 records
-        print('Progress: %d records out of %d' % (totalread, gc['totalSize']),
-                file=sys.stderr)
+    yield heads
+    totalread = 0 # will be used in the loop
+    while True:
+        for record in records:
+            yield [record[head] for head in heads]
+        totalread += len(records)
+        if gc['done']: #will need to keep going if >2,000 records
+            break
+        print('Progress (%s): %d records out of %d' % (obj_type, totalread,
+                gc['totalSize']), file=sys.stderr)
         gc = sf.query_more(gc['nextRecordsUrl'],True)
         records = gc['records']
-        totalread += len(records)
-        nt = [ [record[head] for head in heads] for record in records]
-        rt.extend(nt)
-    return rt
 
-def getSpecific(sf, obj, fields, restriction=''):
+def iterBulkQuery(sf, obj, querytext):
     '''
-    Returns a list of lists of the specified fields (a list/iterable)
-    for the given object given the SOQL text restriction (that follows a WHERE)
+    Same output as iterQuery, but runs the query as a Bulk API 2.0 query
+    job on obj: the job is created, polled until it completes and then the
+    result CSV is downloaded in chunks of BULK_CHUNK_SIZE records. This is
+    much faster than paging 2,000 records at a time for large objects.
+    Note that the Bulk API returns every value as text; blank values are
+    converted to None to match the nulls returned by iterQuery
+    '''
+    print('Reading from %s object (bulk query job)' % obj.name,
+            file=sys.stderr)
+    bulk_obj = getattr(sf.bulk2, obj.name)
+    heads = None
+    totalread = 0
+    for chunk in bulk_obj.query(querytext, max_records=BULK_CHUNK_SIZE):
+        if not chunk:
+            continue
+        reader = csv.reader(io.StringIO(chunk))
+        chunk_heads = next(reader) # every chunk starts with a header row
+        if heads is None:
+            heads = chunk_heads
+            yield heads
+        for row in reader:
+            yield [value if value != '' else None for value in row]
+            totalread += 1
+        print('Progress (%s): %d records' % (obj.name, totalread),
+                file=sys.stderr)
+
+def getQuery(sf, querytext):
+    '''
+    Returns a list of lists based on a SOQL query with the fields as the
+    header column in the first list/row
     '''
+    return list(iterQuery(sf, querytext))
+
+def _specificQuery(obj, fields, restriction=''):
+    '''Helper function to build the query text for getSpecific/iterSpecific'''
     qt = 'SELECT ' + ', '.join(fields) + ' FROM '+obj.name
     if restriction:
         qt += ' WHERE '+restriction
-    return getQuery(sf,qt)
+    return qt
+
+def _runQuery(sf, obj, querytext, bulk):
+    '''Helper function to pick between the REST and bulk query generators'''
+    if bulk:
+        return iterBulkQuery(sf, obj, querytext)
+    return iterQuery(sf, querytext)
+
+def getSpecific(sf, obj, fields, restriction='', bulk=False):
+    '''
+    Returns a list of lists of the specified fields (a list/iterable)
+    for the given object given the SOQL text restriction (that follows a WHERE)
+    If bulk is True, the records are exported with a Bulk API query job
+    '''
+    return list(iterSpecific(sf, obj, fields, restriction, bulk))
+
+def iterSpecific(sf, obj, fields, restriction='', bulk=False):
+    '''
+    Generator version of getSpecific (see iterQuery)
+    Fields of related records can be included with a dot (e.g.
+    College__r.Name) and are returned as regular columns
+    '''
+    rows = _runQuery(sf, obj, _specificQuery(obj, fields, restriction), bulk)
+    if not bulk and any(['.' in field for field in fields]):
+        return _flattenRelationships(rows, fields)
+    return rows # the Bulk API already returns related fields as columns
 
-def getAll(sf, obj):
+def _flattenRelationships(rows, fields):
+    '''
+    Helper generator for iterSpecific: the REST API returns each related
+    record as a nested dict (or None) in a single column, so this replaces
+    the header with fields and pulls each dotted field out of its dict
+    '''
+    heads = next(rows, None)
+    if heads is None:
+        return
+    yield list(fields)
+    paths = []
+    for field in fields:
+        parts = field.split('.')
+        paths.append((heads.index(parts[0]), parts[1:]))
+    for row in rows:
+        newrow = []
+        for col, parts in paths:
+            value = row[col]
+            for part in parts:
+                if value is None: # no related record
+                    break
+                value = value[part]
+            newrow.append(value)
+        yield newrow
+
+def getAll(sf, obj, bulk=False):
     '''
     Returns a list of lists of all of the fields and all of the records
     for a given object
+    If bulk is True, the records are exported with a Bulk API query job
+    '''
+    return list(iterAll(sf, obj, bulk))
+
+def iterAll(sf, obj, bulk=False):
     '''
-    fields = getFields(obj) #returns a list of all fields in the object
-    qt = 'SELECT ' + ', '.join(fields) +' FROM '+obj.name
-    return getQuery(sf,qt)
+    Generator version of getAll (see iterQuery)
+    '''
+    fields = getFields(obj, bulk) #returns a list of all fields in the object
+    return _runQuery(sf, obj, _specificQuery(obj, fields), bulk)
+
+def updateCollection(sf, obj_name, updates, batch_size=COLLECTION_SIZE,
+                     retries=2):
+    '''
+    Updates records of obj_name (e.g. 'Contact') with the sObject
+    Collections API, batch_size records per call. updates is a list of
+    (Id, dict of field: new value) tuples. A batch whose call fails (e.g.
+    a dropped connection) is retried up to retries times with a growing
+    pause; if it still fails, each of its records is reported as failed.
+    Returns a list of lists with the header ['Id', 'Success', 'Errors']
+    '''
+    results = [['Id', 'Success', 'Errors']]
+    for start in range(0, len(updates), batch_size):
+        batch = updates[start:start+batch_size]
+        records = []
+        for sf_id, fields in batch:
+            record = {'attributes': {'type': obj_name}, 'id': sf_id}
+            record.update(fields)
+            records.append(record)
+        for attempt in range(retries+1):
+            try:
+                response = sf.restful('composite/sobjects', method='PATCH',
+                        json={'allOrNone': False, 'records': records})
+                break
+            except Exception as err:
+                print('Batch starting at %d failed (%s)' % (start, err),
+                        file=sys.stderr)
+                response = None
+                if attempt < retries:
+                    time.sleep(2 ** attempt)
+        if response is None:
+            results.extend([[sf_id, False, 'Batch failed after %d tries' %
+                                    (retries+1)] for sf_id, fields in batch])
+        else: # results are returned in the same order as the records
+            for (sf_id, fields), result in zip(batch, response):
+                errors = '; '.join([e['statusCode'] + ': ' + e['message']
+                                    for e in result.get('errors', [])])
+                results.append([sf_id, result['success'], errors])
+        print('Progress (%s): %d updates sent out of %d' % (obj_name,
+                min(start+batch_size, len(updates)), len(updates)),
+                file=sys.stderr)
+    return results
@@ -0,0 +1,186 @@
+#!python3
+'''
+This module uses the ssf module to save local CSV backups of Salesforce
+objects. Objects are fetched concurrently (one thread per object, all
+sharing the same authenticated connection) and each one is written to its
+CSV file as the pages of records arrive.
+
+In incremental mode, a watermark (the latest SystemModstamp seen) is kept
+per object in a state folder along with a compacted snapshot of the object.
+Only records modified since the watermark are downloaded; these are saved
+as the backup file and merged (by Id) into the snapshot. Deleted records
+can't be seen by a SystemModstamp query, so a full snapshot is taken every
+few days to drop them.
+'''
+from . import ssf
+from ..tabletools import tabletools as tt
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import datetime
+import json
+import os
+import shutil
+import sys # for stderr
+import time
+
+STATE_FILE = 'backup_state.json' # watermarks, kept in the state folder
+STAMP = 'SystemModstamp'
+
+def backup_object(sf, obj_name, fn, bulk=False):
+    '''
+    Streams every field of every record of the named object (e.g. 'Contact')
+    to the CSV file fn and returns a list with the throughput details:
+    [object name, records, seconds, bytes written, 'full']
+    '''
+    start = time.perf_counter()
+    rows = ssf.iterAll(sf, getattr(sf, obj_name), bulk)
+    count = tt.stream_to_csv(fn, rows)
+    seconds = time.perf_counter() - start
+    return [obj_name, max(count-1, 0), seconds, os.path.getsize(fn), 'full']
+
+def load_state(state_dir):
+    '''Returns the dict of per object watermarks saved in state_dir'''
+    fn = os.path.join(state_dir, STATE_FILE)
+    if not os.path.exists(fn):
+        return {}
+    with open(fn) as f:
+        return json.load(f)
+
+def save_state(state_dir, state):
+    '''Saves the dict of per object watermarks to state_dir'''
+    with open(os.path.join(state_dir, STATE_FILE), 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+def soql_stamp(value):
+    '''
+    Converts a SystemModstamp as returned by the REST API
+    (2017-06-01T14:02:11.000+0000) or Bulk API (2017-06-01T14:02:11.000Z)
+    to a SOQL datetime literal (2017-06-01T14:02:11Z); both are in UTC
+    '''
+    return value[:19] + 'Z'
+
+def _track_stamp(rows, found):
+    '''
+    Helper generator that passes rows through unchanged while saving
+    the latest SystemModstamp seen to found['stamp']
+    '''
+    col = None
+    for row in rows:
+        if col is None:
+            col = row.index(STAMP) # first row is the header
+        elif row[col]:
+            stamp = soql_stamp(row[col])
+            if stamp > found['stamp']:
+                found['stamp'] = stamp
+        yield row
+
+def _merge_snapshot(snapshot, delta_fn):
+    '''
+    Merges the changed records in delta_fn into the snapshot file by Id:
+    changed records replace the old version in place, new ones are added
+    at the end. Returns the number of records in the new snapshot
+    '''
+    with open(snapshot, encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        id_col = header.index('Id')
+        records = {row[id_col]: row for row in reader}
+    with open(delta_fn, encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        if next(reader, None) is not None: # an empty file has no header
+            for row in reader:
+                records[row[id_col]] = row
+    temp = snapshot + '.tmp'
+    tt.stream_to_csv(temp, [header] + list(records.values()))
+    os.replace(temp, snapshot) # only replace the snapshot once complete
+    return len(records)
+
+def incremental_backup_object(sf, obj_name, fn, state_dir, obj_state,
+                              full_every=7, bulk=False):
+    '''
+    Incremental version of backup_object: writes only the records of
+    obj_name modified since the watermark in obj_state (a dict with keys
+    'watermark' and 'last_full') to fn and merges them into the snapshot
+    in state_dir. If there is no snapshot or the last full snapshot is at
+    least full_every days old, a full backup is taken instead and copied to
+    the snapshot. Returns the backup_object results plus the updated
+    obj_state as a final list item
+    '''
+    start = time.perf_counter()
+    today = datetime.date.today()
+    snapshot = os.path.join(state_dir, obj_name + '_snapshot.csv')
+    obj = getattr(sf, obj_name)
+    found = {'stamp': obj_state.get('watermark', '')}
+    if (not obj_state.get('watermark') or not os.path.exists(snapshot) or
+            (today - datetime.date.fromisoformat(obj_state['last_full'])
+                ).days >= full_every):
+        mode = 'full'
+        count = tt.stream_to_csv(fn, _track_stamp(ssf.iterAll(sf, obj, bulk),
+                                                  found))
+        shutil.copyfile(fn, snapshot)
+        obj_state = {'watermark': found['stamp'],
+                     'last_full': today.isoformat()}
+    else:
+        mode = 'delta'
+        with open(snapshot, encoding='utf-8', newline='') as f:
+            fields = next(csv.reader(f)) # same columns as the snapshot
+        # >= because the watermark drops milliseconds; the merge by Id
+        # means that records seen twice do no harm
+        restriction = STAMP + ' >= ' + obj_state['watermark']
+        count = tt.stream_to_csv(fn, _track_stamp(
+                ssf.iterSpecific(sf, obj, fields, restriction, bulk), found))
+        total = _merge_snapshot(snapshot, fn)
+        print('%s snapshot now has %d records' % (obj_name, total),
+                file=sys.stderr)
+        obj_state = dict(obj_state, watermark=found['stamp'])
+    seconds = time.perf_counter() - start
+    return [obj_name, max(count-1, 0), seconds, os.path.getsize(fn), mode,
+            obj_state]
+
+def backup_objects(sf, objects, folder, suffix, bulk=False, workers=None,
+                   state_dir=None, full_every=7):
+    '''
+    Backs up each object in the list objects to folder/object_suffix.csv
+    using a pool of threads (by default one per object) and returns a list
+    of the results from backup_object (in the same order as objects)
+    If state_dir is given, incremental backups are taken instead (see
+    incremental_backup_object) and the watermarks saved in state_dir are
+    updated once every object has finished
+    '''
+    if not workers:
+        workers = len(objects)
+    if state_dir:
+        os.makedirs(state_dir, exist_ok=True)
+        state = load_state(state_dir)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for obj in objects:
+            fn = os.path.join(folder, obj + '_' + suffix + '.csv')
+            if state_dir:
+                futures.append(executor.submit(incremental_backup_object,
+                        sf, obj, fn, state_dir, state.get(obj, {}),
+                        full_every, bulk))
+            else:
+                futures.append(executor.submit(backup_object, sf, obj, fn,
+                        bulk))
+        results = [future.result() for future in futures]
+    if state_dir:
+        for result in results:
+            state[result[0]] = result.pop()
+        save_state(state_dir, state)
+    return results
+
+def print_throughput(results, total_seconds):
+    '''Prints a summary table of the results from backup_objects'''
+    print('%-20s %-5s %10s %9s %12s %10s' % ('Object', 'Mode', 'Records',
+                                    'Seconds', 'Bytes', 'Records/s'),
+            file=sys.stderr)
+    for obj, records, seconds, size, mode in results:
+        print('%-20s %-5s %10d %9.1f %12d %10.0f' % (obj, mode, records,
+                seconds, size, records/seconds if seconds else 0),
+                file=sys.stderr)
+    total_records = sum([x[1] for x in results])
+    print('%-20s %-5s %10d %9.1f %12d %10.0f' % ('Total (wall clock)', '',
+            total_records, total_seconds, sum([x[3] for x in results]),
+            total_records/total_seconds if total_seconds else 0),
+            file=sys.stderr)
@@ -0,0 +1,226 @@
+#!python3
+'''
+This module uses the Salesforce Bulk API to load record updates (or
+inserts) in batches. The records are split into batches of a set size and several
+batches are run at the same time (each as its own bulk job), with a
+summary of the throughput and of any failures printed at the end.
+
+Fields are cleared with the Bulk API convention of sending the value
+#N/A (the REST API's fieldsToNull is not supported in bulk updates).
+
+An optional Journal records the Ids accepted by each batch as soon as the
+batch finishes, so a load that dies partway through can be rerun and will
+only send the records that weren't accepted the first time. The journal
+also keeps a hash of the input file and of each accepted record, so a
+journal left by a different input is ignored and a record is only skipped
+if it is being sent with exactly the same values.
+'''
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import hashlib
+from itertools import islice
+import json
+import os
+import sys # for stderr
+import threading
+import time
+
+NULL_VALUE = '#N/A' # tells the Bulk API to clear a field
+DEFAULT_BATCH_SIZE = 2000
+DEFAULT_WORKERS = 4
+
+def file_hash(fn):
+    '''Returns the SHA-256 hex digest of the contents of file fn'''
+    digest = hashlib.sha256()
+    with open(fn, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def payload_hash(record):
+    '''Returns a short hash of the values sent for a record (a dict)'''
+    text = json.dumps(record, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+class Journal():
+    def __init__(self, fn, source_hash=None):
+        '''
+        Opens the journal file fn (a header line with source_hash, e.g. the
+        file_hash of the input, then one JSON line per finished batch),
+        reading the Ids accepted by any earlier runs into self.accepted
+        (Id: payload_hash of the record sent). A journal written for a
+        different source_hash (or with an unreadable header) is ignored and
+        replaced. A batch line that can't be read (e.g. half written when
+        the run died) is skipped with a warning and, if it is the last line,
+        cut off so new batches are appended after the last complete one
+        '''
+        self.fn = fn
+        self.source_hash = source_hash
+        self.accepted = {}
+        self.lock = threading.Lock() # batches finish on different threads
+        if os.path.exists(fn):
+            if self._read():
+                return
+            print('Ignoring %s: its header does not match this input' % fn,
+                    file=sys.stderr)
+        with open(fn, 'w') as f:
+            f.write(json.dumps({'source': source_hash}) + '\n')
+
+    def _read(self):
+        '''Reads the accepted Ids from an existing journal file, returning
+        False (and reading nothing) if the header line doesn't match
+        self.source_hash'''
+        with open(self.fn, 'rb') as f:
+            try:
+                header = json.loads(f.readline().decode('utf-8'))
+            except ValueError:
+                return False
+            if type(header) is not dict or \
+                    header.get('source') != self.source_hash:
+                return False
+            good_end = f.tell() # end of the last complete line
+            for i, line in enumerate(f, 2):
+                if not line.strip():
+                    continue
+                try:
+                    accepted = json.loads(line.decode('utf-8'))['accepted']
+                    if not line.endswith(b'\n'):
+                        raise ValueError('no end of line')
+                except (ValueError, KeyError, TypeError):
+                    print('Warning: skipping unreadable line %d of %s' %
+                            (i, self.fn), file=sys.stderr)
+                    continue
+                self.accepted.update(accepted)
+                good_end = f.tell()
+        if good_end < os.path.getsize(self.fn):
+            with open(self.fn, 'r+b') as f:
+                f.truncate(good_end)
+        return True
+
+    def is_accepted(self, record):
+        '''True if an earlier batch sent the record with the same values'''
+        sent = self.accepted.get(record['Id'])
+        return sent is not None and sent == payload_hash(record)
+
+    def record(self, records):
+        '''Appends the Ids and payload hashes of the records accepted by a
+        batch to the journal'''
+        accepted = {record['Id']: payload_hash(record) for record in records}
+        with self.lock:
+            with open(self.fn, 'a') as f:
+                f.write(json.dumps({'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                                    'accepted': accepted}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.accepted.update(accepted)
+
+def _load_batch(sf, obj_name, operation, batch, journal=None):
+    '''
+    Helper function to send one batch of records as a bulk operation
+    ('update' or 'insert') and
+    return [response list (one dict per record), seconds taken]
+    A batch that fails outright gets a failed response for every record
+    If a journal is given, the accepted records are saved to it
+    '''
+    start = time.perf_counter()
+    try:
+        bulk_type = getattr(sf.bulk, obj_name)
+        response = getattr(bulk_type, operation)(batch, batch_size=len(batch))
+    except Exception as err:
+        print('Batch failed (%s)' % err, file=sys.stderr)
+        response = [{'success': False, 'created': False,
+                     'id': record.get('Id'),
+                     'errors': [str(err)]} for record in batch]
+    if journal: # responses are in the same order as the batch
+        journal.record([record for record, result in
+                        zip(batch, response) if result['success']])
+    return [response, time.perf_counter() - start]
+
+def bulk_update(sf, obj_name, records, batch_size=DEFAULT_BATCH_SIZE,
+                workers=DEFAULT_WORKERS, journal=None):
+    '''
+    Updates records (an iterable of dicts that each include the record 'Id')
+    of obj_name (e.g. 'Enrollment__c') batch_size records at a time with
+    up to workers batches running at once. Returns a tuple of:
+        responses: one dict per record sent (in the same order as records)
+        batches: list of [batch number, records, failures, seconds]
+    If a Journal is given, records it lists as already accepted (with the
+    same values) are skipped and the ones accepted now are added to it
+    '''
+    return _bulk_load(sf, obj_name, 'update', records, batch_size, workers,
+                      journal)
+
+def bulk_insert(sf, obj_name, records, batch_size=DEFAULT_BATCH_SIZE,
+                workers=DEFAULT_WORKERS):
+    '''
+    Same as bulk_update, but inserts new records (dicts without an 'Id');
+    the 'id' of each response is the Id of the new record
+    '''
+    return _bulk_load(sf, obj_name, 'insert', records, batch_size, workers)
+
+def _bulk_load(sf, obj_name, operation, records, batch_size, workers,
+               journal=None):
+    '''
+    Helper function with the batching logic of bulk_update/bulk_insert
+    Records are pulled from the iterable one batch at a time as running
+    batches finish, so only about workers batches are held at once
+    '''
+    skipped = 0
+    def unaccepted(records):
+        '''Generator that drops the records the journal already accepted'''
+        nonlocal skipped
+        for record in records:
+            if journal.is_accepted(record):
+                skipped += 1
+            else:
+                yield record
+
+    if journal and journal.accepted:
+        records = unaccepted(records)
+    records = iter(records)
+    responses = []
+    batches = []
+    running = {} # future: batch number
+    finished = {} # batch number: [response, seconds] (until reported)
+    submitted = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            while len(running) < workers:
+                chunk = list(islice(records, batch_size))
+                if not chunk:
+                    break
+                submitted += 1
+                running[executor.submit(_load_batch, sf, obj_name, operation,
+                                        chunk, journal)] = submitted
+            if not running:
+                break
+            done, not_done = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished[running.pop(future)] = future.result()
+
+            # Report the finished batches in order
+            while len(batches) + 1 in finished:
+                i = len(batches) + 1
+                response, seconds = finished.pop(i)
+                responses.extend(response)
+                failures = len([x for x in response if not x['success']])
+                batches.append([i, len(response), failures, seconds])
+                print('Batch %d: %d records, %d failures (%.1fs)' % (
+                        i, len(response), failures, seconds), file=sys.stderr)
+    if skipped:
+        print('Skipped %d records accepted in an earlier run (see %s)' % (
+                skipped, journal.fn), file=sys.stderr)
+    return (responses, batches)
+
+def print_summary(batches, total_seconds):
+    '''Prints the throughput and failures from the batches of bulk_update
+    (or bulk_insert)'''
+    records = sum([x[1] for x in batches])
+    failures = sum([x[2] for x in batches])
+    print('%d records in %d batches in %.1fs (%.0f records/sec)' % (records,
+            len(batches), total_seconds,
+            records/total_seconds if total_seconds else 0), file=sys.stderr)
+    print('%d failures' % failures, file=sys.stderr)
+    for batch, count, fails, seconds in batches:
+        if fails:
+            print('  Batch %d: %d of %d records failed' % (batch, fails,
+                    count), file=sys.stderr)
@@ -0,0 +1,305 @@
+#!python3
+'''
+This file defines a "ColumnTable" class with the same interface as the
+"Table" class in tableclass.py, but with the data stored by column instead
+of as a list of lists. Columns of ints or floats are kept in typed arrays
+and columns of strings with many repeats are dictionary encoded (an array
+of small integer codes plus a list of the distinct values), so big tables
+take much less memory and column operations don't need to touch every row.
+
+Rows handed out by this class (get_row, rows, get_match_rows, etc.) are
+new lists built from the columns, so changing them does NOT change the
+table; use apply_func/apply_func_cols/add_column to change the data.
+'''
+from array import array
+from . import tabletools as tt
+
+class EncodedColumn():
+    ''' Dictionary encoded column: values holds each distinct value once and
+    codes holds the position in values of every row's value. Neither is
+    changed in place, so they can be shared between columns and tables '''
+    __slots__ = ('codes', 'values')
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+    def __iter__(self):
+        return map(self.values.__getitem__, self.codes)
+
+def _code_type(distinct):
+    '''Returns the smallest array type code that can hold distinct codes'''
+    if distinct <= 1 << 8:
+        return 'B'
+    elif distinct <= 1 << 16:
+        return 'H'
+    else:
+        return 'L'
+
+def make_column(values):
+    ''' Returns the most compact storage for a list of column values: an
+    array for all ints or all floats, an EncodedColumn for strings (or None)
+    with at least two repeats per distinct value on average, otherwise the
+    list itself '''
+    kinds = set(map(type, values))
+    if kinds == {int}:
+        try:
+            return array('q', values)
+        except OverflowError:
+            return values
+    elif kinds == {float}:
+        return array('d', values)
+    elif values and kinds <= {str, type(None)}:
+        lookup = {} # value: code
+        codes = [lookup.setdefault(value, len(lookup)) for value in values]
+        if len(lookup) <= len(values) // 2:
+            return EncodedColumn(array(_code_type(len(lookup)), codes),
+                                 list(lookup))
+    return values
+
+def _decode(col):
+    '''Returns the values of a column as an indexable sequence'''
+    if type(col) is EncodedColumn:
+        values = col.values
+        return [values[code] for code in col.codes]
+    return col
+
+def _take(col, rows):
+    '''Returns a column with only the values at the positions in rows'''
+    if type(col) is EncodedColumn:
+        return EncodedColumn(array(col.codes.typecode,
+                                   [col.codes[i] for i in rows]), col.values)
+    elif type(col) is array:
+        return array(col.typecode, [col[i] for i in rows])
+    return [col[i] for i in rows]
+
+def _read_csv_columns(fn):
+    ''' Reads a csv file (as in tabletools.grab_csv_table) straight into
+    one list per column, returning the header row and the column lists '''
+    import csv
+    with open(fn, errors='ignore') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        columns = [[] for i in header]
+        appends = [column.append for column in columns]
+        for row in reader:
+            if len(row) != len(header):
+                raise Exception('Row %d of %s has %d columns, not %d' %
+                                (reader.line_num, fn, len(row), len(header)))
+            for append, value in zip(appends, row):
+                append(value)
+    return (header, columns)
+
+class ColumnTable():
+    def __init__(self, source, copy=True):
+        '''
+        Two modes for initialization. The first is to send a list of lists.
+        The second is to send a csv filename. If neither is true, will
+        raise an exception.
+        Unlike Table, every row must have as many values as the header row;
+        ragged rows (in the list or the csv file) raise an exception.
+        The columns are always built anew, so copy (which matters for
+        Table) has no effect.
+        '''
+        errmsg = ('ColumnTable requires a list of lists or CSV file' +
+                ' filename to instantiate')
+        if type(source) is list:
+            if type(source[0]) is list:
+                header = source[0]
+                for i, row in enumerate(source[1:]):
+                    if len(row) != len(header):
+                        raise Exception('Row %d has %d columns, not %d' %
+                                        (i+1, len(row), len(header)))
+                if len(source) > 1:
+                    columns = [list(col) for col in zip(*source[1:])]
+                else:
+                    columns = [[] for i in header]
+            else:
+                raise Exception(errmsg)
+        elif type(source) is str:
+            header, columns = _read_csv_columns(source)
+        else:
+            raise Exception(errmsg)
+        self._set_columns(header, [make_column(col) for col in columns])
+
+    @classmethod
+    def from_columns(cls, header, columns):
+        '''Returns a new ColumnTable sharing already built columns (from
+        make_column or another ColumnTable) with the header row labels'''
+        table = cls.__new__(cls)
+        table._set_columns(header, columns)
+        return table
+
+    def _set_columns(self, header, columns):
+        self.columns = list(columns)
+        self.header = {label: i for i, label in enumerate(header)}
+        self.indexes = {} #column label-->dictionary built by build_index
+        self.length = len(self.columns[0]) if self.columns else 0
+
+    def _values(self, column):
+        '''Returns the values of the column as an indexable sequence'''
+        return _decode(self.columns[self.header[column]])
+
+    def _all_values(self, column_list=None):
+        '''Returns _values for each column in column_list (default all)'''
+        if column_list is None:
+            return [_decode(col) for col in self.columns]
+        return [self._values(column) for column in column_list]
+
+    def __len__(self):
+        return self.length
+
+    def get_header_row(self):
+        '''Returns the ordered header row (without changing data)'''
+        hrow = []
+        for i in self.header: hrow.append([self.header[i], i])
+        hrow.sort()
+        hrow = [j for i, j in hrow]
+        return hrow
+
+    def get_full_table(self):
+        '''Returns a list of lists with the header row followed by the rows
+        '''
+        fullData = list(self.rows())
+        fullData.insert(0, self.get_header_row())
+        return fullData
+
+    def new_subtable(self, column_list, new_names=None, rows=None):
+        '''Returns a new ColumnTable with the specified columns
+        If an optional list of replacement column names exists,
+        the new table will replace the current headers names with them.
+        If an optional list of row positions exists, only those rows
+        are included. Otherwise the columns are shared with this table,
+        not copied'''
+        columns = [self.columns[self.header[col]] for col in column_list]
+        if rows is not None:
+            columns = [_take(col, rows) for col in columns]
+        return ColumnTable.from_columns(new_names if new_names else
+                                        column_list, columns)
+
+    def apply_func_cols(self, cols, func):
+        '''applies the passed function to the given columns for each row'''
+        for column in cols:
+            self.apply_func(column, func)
+
+    def apply_func(self, column, func):
+        '''applies the passed function to the given column for each row
+        For a dictionary encoded column, func is only called once for each
+        distinct value, so it should depend only on the value passed'''
+        i = self.header[column]
+        col = self.columns[i]
+        if type(col) is EncodedColumn:
+            self.columns[i] = EncodedColumn(col.codes,
+                                            [func(x) for x in col.values])
+        else:
+            self.columns[i] = make_column([func(x) for x in col])
+        self.indexes.pop(column, None) # values changed, so index is stale
+
+    def create_dict(self, key_col, val_col):
+        '''Returns a dictionary with a simple correspondence of one
+        column containing the keys and one column containing
+        the values. Columns are specified by label (in header dict)'''
+        return dict(zip(self._values(key_col), self._values(val_col)))
+
+    def create_dict_list(self, key_col, val_cols):
+        '''Returns a dictionary with key_col as the key and values
+        (to be assigned as a list) specified by the val_cols list
+        '''
+        return dict(zip(self._values(key_col),
+                        map(list, zip(*self._all_values(val_cols)))))
+
+    def get_column(self, column):
+        '''Returns a simple list with only the specified column as
+        specified by label (key in the header dict)'''
+        return list(self._values(column))
+
+    def get_columns(self, column_list):
+        '''Returns a generator of lists with only the specified columns.
+        Columns are specified by the label (key in the header dict)
+        Does not create a mutable reference back to the original'''
+        return map(list, zip(*self._all_values(column_list)))
+
+    def get_row(self, row_num):
+        '''Returns a row (as a new list) based on a row index'''
+        return [col[row_num] for col in self.columns]
+
+    def __getitem__(self, key):
+        '''Allows index ColumnTable[i:j] and list generators'''
+        if type(key) is slice:
+            return [self.get_row(i) for i in range(self.length)[key]]
+        if key < 0:
+            key += self.length
+        if not 0 <= key < self.length:
+            raise IndexError('ColumnTable index out of range')
+        return self.get_row(key)
+
+    def __iter__(self):
+        return self.rows()
+
+    def get_match_rows(self, column, match_value):
+        '''Returns a generator of rows where column specified by
+        column matches the value in match_value. Uses the index for column
+        if one has been built with build_index'''
+        if column in self.indexes:
+            for row in self.indexes[column].get(match_value, []): yield row
+        else:
+            col = self.columns[self.header[column]]
+            if type(col) is EncodedColumn:
+                codes = {code for code, value in enumerate(col.values)
+                                if value == match_value}
+                col = col.codes
+            else:
+                codes = None
+            for i, value in enumerate(col):
+                if (value in codes if codes is not None
+                        else value == match_value):
+                    yield self.get_row(i)
+
+    def build_index(self, column):
+        '''Makes a single pass through the table and returns a dictionary
+        with each value of column as the key and a list of the rows with
+        that value (in table order). The dictionary is kept and reused by
+        get_match_rows until the column is changed with apply_func or the
+        index is rebuilt'''
+        index = {}
+        for value, row in zip(self._values(column), self.rows()):
+            if value in index:
+                index[value].append(row)
+            else:
+                index[value] = [row]
+        self.indexes[column] = index
+        return index
+
+    def get_index(self, column):
+        '''Returns the index built for column, building it if necessary'''
+        if column not in self.indexes:
+            return self.build_index(column)
+        return self.indexes[column]
+
+    def rows(self):
+        '''Returns a generator of each row of data (as new lists)'''
+        return map(list, zip(*self._all_values()))
+
+    def get_header_dict(self):
+        '''Returns a copy of the table's header dictionary'''
+        return self.header.copy() #Shallow copy OK because these are immutable
+
+    def c(self, header_name):
+        '''short named function to enable reference to correct column'''
+        return self.header[header_name]
+
+    def add_column(self, header, col_data):
+        '''tacks a new column of data onto the table'''
+        if self.length != len(col_data):
+            raise Exception('New column not same length as existing table')
+        self.header[header] = max(self.header.values())+1
+        self.columns.append(make_column(list(col_data)))
+
+    def to_csv(self, fn):
+        '''sends the full table to a CSV file'''
+        tt.table_to_csv(fn, self.get_full_table())
@@ -6,17 +6,19 @@ a lightweight table implementation as a list of lists
 from . import tabletools as tt
 
 class Table():
-    def __init__(self, source):
+    def __init__(self, source, copy=True):
         '''
         Two modes for initialization. The first is to send a list of lists.
         The second is to send a csv filename. If neither is true, will
         raise an exception.
+        If copy is False, a list of lists is used without copying its rows,
+        so the Table shares (and changes) the rows of source.
         '''
         errmsg = ('Table requires a list of lists or CSV file' +
                 ' filename to instantiate')
         if type(source) is list:
             if type(source[0]) is list:
-                fullList = tt.copy_table(source)
+                fullList = tt.copy_table(source) if copy else source
             else:
                 raise Exception(errmsg)
         elif type(source) is str:
@@ -32,6 +34,7 @@ class Table():
         #references the same interior lists in memory
         self.data = fullList[:] #still passes interior lists by ref
         self.header = tt.slice_header(self.data)
+        self.indexes = {} #column label-->dictionary built by build_index
 
     def __len__(self):
         return len(self.data)
@@ -51,27 +54,28 @@ class Table():
         tt.add_header(fullData, self.header)
         return fullData
 
-    def new_subtable(self, column_list, new_names=None):
-        '''Returns a new Table with the specified columns
+    def new_subtable(self, column_list, new_names=None, rows=None):
+        '''Returns a new Table (a TableView) with the specified columns
         If an optional list of replacement column names exists,
-        the new table will replace the current headers names with them'''
-        fullData = list(self.get_columns(column_list))
-        if new_names:
-            fullData.insert(0, new_names)
-        else:
-            fullData.insert(0, column_list)
-        return Table(fullData)
+        the new table will replace the current headers names with them.
+        If an optional list of row positions exists, only those rows
+        are included. The data isn't copied until the new table is
+        changed or hands out its rows (see TableView)'''
+        return TableView(self, column_list, new_names, rows)
 
     def apply_func_cols(self, cols, func):
         '''applies the passed function to the given columns for each row'''
         for row in self.data:
             for column in cols:
                 row[self.header[column]] = func(row[self.header[column]])
+        for column in cols:
+            self.indexes.pop(column, None) # values changed, so index is stale
 
     def apply_func(self, column, func):
         '''applies the passed function to the given column for each row'''
         for row in self.data:
             row[self.header[column]] = func(row[self.header[column]])
+        self.indexes.pop(column, None) # values changed, so index is stale
 
     def create_dict(self, key_col, val_col):
         '''Returns a dictionary with a simple correspondence of one
@@ -114,9 +118,35 @@ class Table():
 
     def get_match_rows(self, column, match_value):
         '''Returns a generator of (mutable) rows where column specified by
-        column matches the value in match_value'''
+        column matches the value in match_value. Uses the index for column
+        if one has been built with build_index'''
+        if column in self.indexes:
+            for row in self.indexes[column].get(match_value, []): yield row
+        else:
+            for row in self.data:
+                if row[self.header[column]] == match_value: yield row
+
+    def build_index(self, column):
+        '''Makes a single pass through the table and returns a dictionary
+        with each value of column as the key and a list of the (mutable)
+        rows with that value (in table order). The dictionary is kept and
+        reused by get_match_rows until the column is changed with apply_func
+        or the index is rebuilt (e.g. after editing rows directly)'''
+        col = self.header[column]
+        index = {}
         for row in self.data:
-            if row[self.header[column]] == match_value: yield row
+            if row[col] in index:
+                index[row[col]].append(row)
+            else:
+                index[row[col]] = [row]
+        self.indexes[column] = index
+        return index
+
+    def get_index(self, column):
+        '''Returns the index built for column, building it if necessary'''
+        if column not in self.indexes:
+            return self.build_index(column)
+        return self.indexes[column]
 
     def rows(self):
         '''Returns a (mutable) generator of each row of data'''
@@ -141,3 +171,75 @@ class Table():
     def to_csv(self, fn):
         '''sends the full table to a CSV file'''
         tt.table_to_csv(fn, self.get_full_table())
+
+class TableView(Table):
+    '''
+    A Table made lazily from a subset of the columns (optionally renamed)
+    and rows of another Table. Until it's needed, the view keeps no data of
+    its own: the column methods below read straight from the other table's
+    rows. The first use of self.data (anything that changes the data or
+    hands out mutable rows) copies just the selected rows and columns, and
+    from then on the view is an ordinary Table. Changes made to the other
+    table's rows before that point show through in the view.
+    '''
+    def __init__(self, table, column_list, new_names=None, rows=None):
+        if isinstance(table, TableView) and table._data is None:
+            # A view of a view reads from the same rows as the first view
+            source = table._source
+            positions = [table._positions[table.header[col]]
+                            for col in column_list]
+        else:
+            source = table.data
+            positions = [table.header[col] for col in column_list]
+        if rows is not None:
+            source = [source[i] for i in rows]
+        self._source = source # shared rows (until the data is copied)
+        self._positions = positions # column positions in those rows
+        self._data = None
+        labels = new_names if new_names else column_list
+        self.header = {label: i for i, label in enumerate(labels)}
+        self.indexes = {} #column label-->dictionary built by build_index
+
+    @property
+    def data(self):
+        '''Copies the selected rows and columns the first time it's used'''
+        if self._data is None:
+            positions = self._positions
+            self._data = [[row[p] for p in positions] for row in self._source]
+            self._source = None
+        return self._data
+
+    def _position(self, column):
+        '''Returns the position of column in the shared rows'''
+        return self._positions[self.header[column]]
+
+    def __len__(self):
+        if self._data is None:
+            return len(self._source)
+        return len(self._data)
+
+    def create_dict(self, key_col, val_col):
+        if self._data is not None:
+            return Table.create_dict(self, key_col, val_col)
+        key = self._position(key_col)
+        val = self._position(val_col)
+        return {row[key]: row[val] for row in self._source}
+
+    def create_dict_list(self, key_col, val_cols):
+        if self._data is not None:
+            return Table.create_dict_list(self, key_col, val_cols)
+        key = self._position(key_col)
+        vals = [self._position(col) for col in val_cols]
+        return {row[key]: [row[p] for p in vals] for row in self._source}
+
+    def get_column(self, column):
+        if self._data is not None:
+            return Table.get_column(self, column)
+        p = self._position(column)
+        return [row[p] for row in self._source]
+
+    def get_columns(self, column_list):
+        if self._data is not None:
+            return Table.get_columns(self, column_list)
+        positions = [self._position(col) for col in column_list]
+        return ([row[p] for p in positions] for row in self._source)
@@ -5,7 +5,7 @@ as lists of lists (generally from imported CSV files)
 This file generates some more advanced statistics for weekly odds reports
 It has a students table and an applications table as inputs
 '''
-from datetime import date
+from datetime import date, datetime
 
 def copy_table(table):
     '''Utility for returning a copy of a table that doesn't contain references
@@ -46,6 +46,21 @@ def table_to_csv(fn, table):
         writer.writerow(row)
     outf.close()
 
+def stream_to_csv(fn, rows):
+    '''Utility function like table_to_csv that writes rows to a csv file one
+    at a time as they are produced by an iterable (e.g. ssf.iterQuery), so
+    the full table never needs to be held in memory. Returns the number of
+    rows written (including any header row)'''
+    import csv
+    count = 0
+    with open(fn, 'wt', encoding='utf-8') as outf:
+        writer = csv.writer(outf, delimiter=',', quoting=csv.QUOTE_MINIMAL,
+                lineterminator='\n')
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
 def create_dict(table, key_col, val_col):
     '''Returns a dictionary with a simple correspondence of one column
     containing the keys and one column containing the values. Columns
@@ -65,6 +80,98 @@ def grab_csv_table(fn):
             newTable.append(row)
     return newTable
 
+def _csv_date(val):
+    '''Converts a 'YYYY-MM-DD' (or 'MM/DD/YYYY') csv value to a date'''
+    if not val:
+        return None
+    elif len(val) > 4 and val[4] == '-':
+        return date.fromisoformat(val[:10])
+    else:
+        return datetime.strptime(val, '%m/%d/%Y').date()
+
+def _csv_float(val):
+    '''Converts a csv value to a float (blank values to None)'''
+    return float(val) if val else None
+
+def _csv_int(val):
+    '''Converts a csv value to an int (blank values to None)'''
+    return int(val) if val else None
+
+CSV_TYPES = {'date': _csv_date, 'float': _csv_float, 'int': _csv_int}
+
+def _convert_chunk(rows, converters, fn):
+    '''Helper function for iter_csv_chunks that converts a chunk of rows a
+    column at a time; each distinct value in a column is converted once'''
+    if not rows or not converters:
+        return rows
+    columns = [list(col) for col in zip(*rows)]
+    for pos, label, func in converters:
+        try:
+            lookup = {val: func(val) for val in set(columns[pos])}
+        except (ValueError, IndexError) as err:
+            raise Exception('Bad value in column %s of %s: %s' %
+                            (label, fn, err))
+        columns[pos] = [lookup[val] for val in columns[pos]]
+    return [list(row) for row in zip(*columns)]
+
+def iter_csv_chunks(fn, schema=None, columns=None, chunk_size=50000):
+    '''Utility function like grab_csv_table that reads a csv file in chunks
+    of at most chunk_size rows, yielding each chunk as a list of rows
+    (after first yielding the header row alone as [header]). Optional
+    arguments:
+    columns: list of header labels to keep (in that order); the rest of
+        each row is dropped as it is read
+    schema: dictionary of header label: 'date', 'float' or 'int' (see
+        CSV_TYPES, where blank values become None) or a function taking
+        the csv string; those columns are converted a chunk at a time.
+        Other columns are left as strings'''
+    import csv
+    from operator import itemgetter
+    with open(fn, errors='ignore') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        width = len(header)
+        keep = None
+        if columns:
+            missing = [col for col in columns if col not in header]
+            if missing:
+                raise Exception('Columns missing from %s: %s' %
+                                (fn, ', '.join(missing)))
+            keep = [header.index(col) for col in columns]
+            header = list(columns)
+            if len(keep) == 1:
+                take = lambda row: [row[keep[0]]]
+            else:
+                get_kept = itemgetter(*keep)
+                take = lambda row: list(get_kept(row))
+        converters = [(header.index(label), label,
+                       kind if callable(kind) else CSV_TYPES[kind])
+                        for label, kind in (schema or {}).items()]
+
+        yield [header]
+        chunk = []
+        for row in reader:
+            if not row: # blank line
+                continue
+            if len(row) != width:
+                raise Exception('Row %d of %s has %d columns, not %d' %
+                                (reader.line_num, fn, len(row), width))
+            chunk.append(take(row) if keep else row)
+            if len(chunk) == chunk_size:
+                yield _convert_chunk(chunk, converters, fn)
+                chunk = []
+        if chunk:
+            yield _convert_chunk(chunk, converters, fn)
+
+def grab_typed_csv_table(fn, schema=None, columns=None, chunk_size=50000):
+    '''Utility function like grab_csv_table that only keeps the given
+    columns and converts the values of the columns in schema (see
+    iter_csv_chunks for both)'''
+    table = []
+    for chunk in iter_csv_chunks(fn, schema, columns, chunk_size):
+        table.extend(chunk)
+    return table
+
 def _write_row_w_formats(ws, row, line, ff, intf, df, data_cols,dataf):
     '''Helper function to emulate a special case of ws.write_row that
     uses provided formats only for float, int, and date variables'''
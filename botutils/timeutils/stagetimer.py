@@ -0,0 +1,34 @@
+#!python3
+'''
+This module provides a simple stopwatch for scripts that run in several
+stages. Call lap() at the end of each stage and report() at the end of
+the script to print how long each stage took.
+'''
+import time
+
+class StageTimer():
+    def __init__(self):
+        '''The clock starts when the timer is created'''
+        self.stages = [] # list of [stage name, seconds]
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        '''Records the time since the previous lap (or since the timer was
+        created) under the name stage and returns the seconds elapsed'''
+        now = time.perf_counter()
+        elapsed = now - self.last
+        self.stages.append([stage, elapsed])
+        self.last = now
+        return elapsed
+
+    def total(self):
+        '''Returns the total seconds of all recorded stages'''
+        return sum([seconds for stage, seconds in self.stages])
+
+    def report(self):
+        '''Prints a table of the recorded stages and the total'''
+        width = max([len(stage) for stage, seconds in self.stages] + [5])
+        print('Stage timings:')
+        for stage, seconds in self.stages:
+            print('  %-*s %9.2fs' % (width, stage, seconds))
+        print('  %-*s %9.2fs' % (width, 'Total', self.total()), flush=True)
@@ -8,6 +8,7 @@ from botutils.tkintertools import tktools
 from botutils.ADB import AlumniDatabaseInterface as aDBi
 from botutils.tabletools import tableclass as tc
 from botutils.tabletools import tabletools as tt
+from botutils.timeutils import stagetimer
 from nsc_modules import nsc_names as n
 from datetime import date
 
@@ -211,37 +212,59 @@ def combine_s_c_enrollments(s_c_table, hd, daysgap):
 
     return new_s_c_table
 
+def group_student_colleges(nsc_data):
+    '''Makes a single pass through the main table and groups the rows by
+    student and then by college (NCES ID), keeping the original row order
+    within each group. Only students with at least one found record are
+    kept and the not found records are dropped. Returns a list of
+    (sId, [student/college rows, ...]) in order of each student's first row'''
+    hd = nsc_data.get_header_dict()
+    groups = {}
+    found_students = set()
+    for row in nsc_data.rows():
+        sId = row[hd['sId']]
+        found = row[hd[n.RECORD_FOUND_Y_N]]
+        if found == 'Y':
+            found_students.add(sId)
+        elif found == 'N':
+            continue
+        if sId not in groups:
+            groups[sId] = {}
+        student_groups = groups[sId]
+        if row[hd['NCES ID']] in student_groups:
+            student_groups[row[hd['NCES ID']]].append(row)
+        else:
+            student_groups[row[hd['NCES ID']]] = [row]
+
+    return [(sId, list(groups[sId].values())) for sId in groups
+                                              if sId in found_students]
+
+def iter_combined_enrollments(student_colleges, hd, daysgap):
+    '''Generator that takes the result of group_student_colleges and yields
+    the combined rows for one student/college at a time'''
+    sCount = 0 # For screen display
+    for sId, s_c_tables in student_colleges:
+        sCount += 1
+        for s_c_table in s_c_tables:
+            #Now need to process each college in student_table
+            for row in combine_s_c_enrollments(s_c_table, hd, daysgap):
+                yield row
+
+        if not sCount %100: print('%d contacts processed.' % sCount, flush=True)
+
 def combine_contiguous_enrollments(nsc_data, daysgap):
     '''Takes the main table and combines contiguous enrollments for the
     same college and student. Enrollments are judged to be contiguous
     if the days between them is less than daysgap. Enrollments have no
     end date if the end date is after effdate.'''
-    # First get a list of students with matches
-    students_raw = nsc_data.get_columns(['sId', n.RECORD_FOUND_Y_N])
-    students = {student[0] for student in students_raw if student[1]=='Y'}
+    # First group the rows by student and college in a single pass
+    student_colleges = group_student_colleges(nsc_data)
 
     hd = nsc_data.get_header_dict() #So we can reference the elements
-    results_table = []
     # Now process the records for each student
-    print('Beginning to process %d students' % len(students))
-    sCount = 0 # For screen display
-    for sId in students:
-        sCount += 1
-        student_table = list(nsc_data.get_match_rows('sId',sId))
-        colleges = {s[hd['NCES ID']] for s in student_table}
-        for col in colleges:
-            s_c_table = [row for row in student_table
-                                 if row[hd['NCES ID']] == col
-                                     and row[hd['RECORD_FOUND_Y/N']] != 'N']
-
-            #Now need to process each college in student_table
-            s_c_condensed = combine_s_c_enrollments(s_c_table, hd,
-                                daysgap)
-
-            results_table.extend(s_c_condensed)
-
-        #if not sCount % 10: print('.', end='', flush=True)
-        if not sCount %100: print('%d contacts processed.' % sCount, flush=True)
+    print('Beginning to process %d students' % len(student_colleges))
+    results_table = list(iter_combined_enrollments(student_colleges, hd,
+                                                   daysgap))
 
     tt.add_header(results_table, hd)
 
@@ -298,10 +321,11 @@ def add_status_fields(combined_nsc, degree_dict, daysgap, effdate):
     hd = combined_nsc.get_header_dict()
     print('Now cleaning up T/W statuses.')
 
-    # Pass through and determine if T/W fields are T or W
-    students = set(combined_nsc.get_column('sId'))
+    # Pass through and determine if T/W fields are T or W (grouping the
+    # rows by student in a single pass instead of rescanning per student)
+    students = combined_nsc.build_index('sId')
     for student in students:
-        s_rows = list(combined_nsc.get_match_rows('sId', student))
+        s_rows = list(students[student]) # copy so sorting leaves index alone
         if len(s_rows) > 1:
             s_rows.sort(key=lambda x: x[hd['Start Date']])
         big_s = date(1900, 1,1) # big_s and big_e are for checking if there's
@@ -438,23 +462,28 @@ def main(nsc, sch, deg, out, daysgap, effdate):
     print('Allowed days gap is %d' % int(daysgap))
     print('NSC report produced on %s' % effdate)
     print('-'*40)
+    timer = stagetimer.StageTimer()
 
     # Load input files (aborts with error if college/degree incomplete)
     nsc_data, college_dict, degree_dict = grab_inputs(nsc, sch, deg)
+    timer.lap('Load inputs')
 
     # Add a few interpreted columns to the nsc table
     print('Beginning to process NSC file.')
     add_columns_to_nsc_data(nsc_data, college_dict)
+    timer.lap('Add interpreted columns')
 
     # Combine records that reflect contiguous enrollments
     print('Beginning to combine contiguous records.')
     combined_nsc = combine_contiguous_enrollments(nsc_data, daysgap)
+    timer.lap('Combine contiguous enrollments')
     print('-'*40)
 
     # Add Status, DegreeType, Date Verified, DataSource fields
     print('Enrollments combined, now adding status fields.')
     # had previously forced daysgap=40 in the below; not sure why?
     add_status_fields(combined_nsc, degree_dict, daysgap, effdate)
+    timer.lap('Add status fields')
 
     # Add in Salesforce names for students and for colleges
     # ToDo: Pass a "silent" variable to this function based on a to-be-added
@@ -462,15 +491,21 @@ def main(nsc, sch, deg, out, daysgap, effdate):
     print('-'*40)
     print('Adding Salesforce IDs for alumni and colleges')
     add_Salesforce_indices(combined_nsc)
+    timer.lap('Add Salesforce IDs (includes any prompts)')
     
     # Throw out the columns we don't need anymore and reorder others
     print('-'*40)
     print('Creating final output and saving to %s.' % out)
 
     final_output_table = finalize_output_columns(combined_nsc)
+    timer.lap('Finalize output columns')
 
     #Finally, save the output file
     final_output_table.to_csv(out)
+    timer.lap('Write output')
+
+    print('-'*40)
+    timer.report()
 
 if __name__ == '__main__':
     import argparse
@@ -8,12 +8,15 @@ import os
 from botutils.tkintertools import tktools
 from datetime import date, datetime
 from botutils.tabletools import tableclass as tc
+from botutils.tabletools import columntable as ct
 from botutils.tabletools import tabletools as tt
 from botutils.ADB import ContactNamespace as c
 from botutils.ADB import AccountNamespace as a
 from botutils.ADB import EnrollmentNamespace as e
 from botutils.ADB import AlumniDatabaseInterface as aDBi
+from botutils.timeutils import stagetimer
 from nsc_modules import enrollment_match as em
+from nsc_modules import apply_merge
 from collections import Counter
 
 def get_acc_dict(acc_raw):
@@ -29,8 +32,10 @@ def get_con_dict(con_raw):
                                             c.High_School__c,
                                           ])
 
-def main(nsc, db_flag, enr, con, acc):
+def main(nsc, db_flag, enr, con, acc, cache=False, refresh=False,
+         apply=False, dryrun=False, processes=None, columnar=False):
     '''Main control flow for merging new enrollments with old in database'''
+    table_class = ct.ColumnTable if columnar else tc.Table
     print('-'*40)
     print('Output file from intake_nsc.py is %s' % nsc)
     if db_flag:
@@ -39,10 +44,13 @@ def main(nsc, db_flag, enr, con, acc):
         print('Accounts file: %s' % acc)
         print('Contacts file: %s' % con)
         print('Enrollments file: %s' % enr)
+    if columnar:
+        print('Tables will be stored by column')
     print('-'*40)
+    timer = stagetimer.StageTimer()
 
     # Load the intake_nsc file
-    intake_raw = tc.Table(nsc)
+    intake_raw = table_class(nsc)
     nsc_enr = em.get_enrollments_and_chg_vartype(intake_raw)
     year_range = set(intake_raw.get_column('HS Class'))
     print('Year range of %s-%s.' % (min(year_range), max(year_range)))
@@ -51,21 +59,27 @@ def main(nsc, db_flag, enr, con, acc):
     if db_flag:
         restr = c.HS_Class__c + ' IN '
         restr += "('" + "','".join(year_range) + "')"
-        db_res = aDBi.grabThreeMainTables_Analysis(
+        if cache or refresh:
+            db_res = aDBi.grabThreeMainTables_Cached(
+                                        contactRestriction=restr,
+                                        mode='NSCmerge', refresh=refresh)
+        else:
+            db_res = aDBi.grabThreeMainTables_Analysis(
                                         contactRestriction=restr,
                                         mode='NSCmerge')
-        con_raw = tc.Table(db_res[0])
-        acc_raw = tc.Table(db_res[1])
-        enr_raw = tc.Table(db_res[2])
+        con_raw = table_class(db_res[0])
+        acc_raw = table_class(db_res[1])
+        enr_raw = table_class(db_res[2])
     else:
-        acc_raw = tc.Table(acc)
-        con_raw = tc.Table(con)
-        enr_raw = tc.Table(enr)
+        acc_raw = table_class(acc)
+        con_raw = table_class(con)
+        enr_raw = table_class(enr)
 
     # Cleanup the database info
     db_enr = em.get_enrollments_and_chg_vartype(enr_raw, True)
     acc_dict = get_acc_dict(acc_raw)
     con_dict = get_con_dict(con_raw)
+    timer.lap('Load')
 
     # Prior to cycling through, append an index column to the two
     # enrollment tables so we can reference the original row even
@@ -78,12 +92,14 @@ def main(nsc, db_flag, enr, con, acc):
     print('Looking for matches: %d from db, %d from nsc'
             % (len(db_enr), len(nsc_enr)))
 
-    db_enr_map, nsc_enr_map, match_table = em.find_matches(db_enr, nsc_enr)
+    db_enr_map, nsc_enr_map, match_table = em.find_matches(db_enr, nsc_enr,
+                                                           processes)
     unmatched_db =  [x for x in db_enr.rows()  if x[-1] not in db_enr_map]
     unmatched_nsc = [x for x in nsc_enr.rows() if x[-1] not in nsc_enr_map]
 
     print('Still not matched: %d from db, %d from nsc' %
             (len(unmatched_db), len(unmatched_nsc)))
+    timer.lap('Match')
 
     # Use matching information to generate output tables
     print('-'*40)
@@ -100,12 +116,12 @@ def main(nsc, db_flag, enr, con, acc):
                     'Index (for debugging)']]
 
     for row in match_table:
-        # row[0] is always a MatchCase subclass that will have a custom
+        # row.case is always a MatchCase subclass that will have a custom
         # function for each of these three lines if pertinent for this
         # case. Otherwise, the function will return the default None
-        enr_update.append(row[0].enr_update(row[1:], acc_dict))
-        new_enr.append(row[0].new_enr(row[1:]))
-        con_flag.append(row[0].con_flag(row[1:], acc_dict))
+        enr_update.append(row.case.enr_update(row, acc_dict))
+        new_enr.append(row.case.new_enr(row))
+        con_flag.append(row.case.con_flag(row, acc_dict))
 
     # Scrub out the empty rows if a MatchCase had nothing to say
     enr_update = [x for x in enr_update if x]
@@ -113,12 +129,13 @@ def main(nsc, db_flag, enr, con, acc):
     con_flag = [x for x in con_flag if x]
 
     #Rollup the contact flags to have a single row per student
-    con_update = []
-    for student in set(x[0] for x in con_flag[1:]):
-        student_set = [x for x in con_flag if x[0] == student]
-        new_flags = '; '.join([x[2] for x in student_set])
-        con_update.append([student, True, new_flags])
+    student_flags = {}
+    for x in con_flag[1:]:
+        student_flags.setdefault(x[0], []).append(x[2])
+    con_update = [[student, True, '; '.join(flags)] for student, flags in
+                                                    student_flags.items()]
     con_update.insert(0,con_flag[0][:-1])
+    timer.lap('Generate outputs')
 
     # Write output tables to files
     today_ending = date.today().strftime('%m_%d_%Y')
@@ -131,9 +148,19 @@ def main(nsc, db_flag, enr, con, acc):
     tt.table_to_csv(new_enr_fn, new_enr)
     tt.table_to_csv(con_update_fn, con_update)
     tt.table_to_csv(con_long_update_fn, con_flag)
+    timer.lap('Write')
+
+    # Optionally push the output tables straight to Salesforce
+    if apply or dryrun:
+        print('-'*40)
+        print('Applying output tables to Salesforce%s' %
+                (' (dry run)' if dryrun else ''))
+        apply_merge.apply_tables(new_enr, enr_update, con_update,
+                                 'apply_log_' + today_ending + '.csv', dryrun)
+        timer.lap('Apply to Salesforce')
 
     # debugging lines
-    case_list = Counter([x[0] for x in match_table]).most_common()
+    case_list = Counter([x.case for x in match_table]).most_common()
     case_table = [['Matching case','Frequency']]
     case_table.extend([[c[0], c[1]] for c in case_list])
     nsc_h = nsc_enr.get_full_table()[0]
@@ -143,6 +170,7 @@ def main(nsc, db_flag, enr, con, acc):
     match_h = ['Case']
     match_h.extend(nsc_h)
     match_h.extend(db_h)
+    match_table = [x.to_list() for x in match_table]
     match_table.insert(0,match_h)
 
     if not os.path.exists('debugging_output'):
@@ -151,6 +179,8 @@ def main(nsc, db_flag, enr, con, acc):
     tt.table_to_csv('debugging_output/__unmatched_nsc.csv',unmatched_nsc)
     tt.table_to_csv('debugging_output/__unmatched_db.csv',unmatched_db)
     tt.table_to_csv('debugging_output/__matching_cases.csv',case_table)
+    timer.lap('Write debugging output')
+    timer.report()
 
 
 if __name__ == '__main__':
@@ -166,7 +196,27 @@ if __name__ == '__main__':
     parser.add_argument('-con', dest='con', action='store', help=con_help)
     flag_help = 'Ignore popup and grab data from database'
     parser.add_argument('-db', dest='db', action='store_true', help=flag_help)
+    cache_help = 'Use a recent local snapshot of the database (implies -db)'
+    parser.add_argument('-cache', dest='cache', action='store_true',
+            help=cache_help)
+    refresh_help = 'Refresh the local snapshot of the database (implies -db)'
+    parser.add_argument('-refresh', dest='refresh', action='store_true',
+            help=refresh_help)
+    apply_help = 'Load the output tables straight into Salesforce'
+    parser.add_argument('-apply', dest='apply', action='store_true',
+            help=apply_help)
+    dry_help = 'Log what -apply would send to Salesforce without sending it'
+    parser.add_argument('-dryrun', dest='dryrun', action='store_true',
+            help=dry_help)
+    proc_help = 'Number of processes to use for matching students'
+    parser.add_argument('-processes', dest='processes', type=int,
+            help=proc_help)
+    columnar_help = 'Store the data tables by column (uses less memory)'
+    parser.add_argument('-columnar', dest='columnar', action='store_true',
+            help=columnar_help)
     args = parser.parse_args()
+    if args.cache or args.refresh:
+        args.db = True
 
     if not args.db and not (args.enr and args.con and args.acc):
         args.db = tktools.get_yes_no(
@@ -185,5 +235,7 @@ if __name__ == '__main__':
         if 'con' in arg_dict: args.con = arg_dict['con'][0]
         if 'acc' in arg_dict: args.acc = arg_dict['acc'][0]
 
-    main(args.nsc, args.db, args.enr, args.con, args.acc)
+    main(args.nsc, args.db, args.enr, args.con, args.acc, args.cache,
+         args.refresh, args.apply, args.dryrun, args.processes,
+         args.columnar)
     s = input('----(hit enter to close)----') # in case the user opens w/ icon
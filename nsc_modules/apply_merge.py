@@ -0,0 +1,84 @@
+#!python3
+'''
+Module used by merge_nsc.py to push its three output tables (new
+enrollments, enrollment updates and contact flags) straight to Salesforce
+with batched Bulk API loads instead of saving them for a manual upload.
+Every record sent (or that would be sent in a dry run) is written to a log
+with the result from Salesforce.
+'''
+from datetime import date
+import time
+from botutils.ADB import ssf
+from botutils.ADB import ssfLoader
+from botutils.tabletools import tabletools as tt
+
+INDEX = 'Index (for debugging)' # merge_nsc column not sent to Salesforce
+
+def _sf_value(value, null):
+    '''Helper function to give the upload value of a cell'''
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    elif value is None or value == '':
+        return null
+    else:
+        return value
+
+def table_to_records(table, null=ssfLoader.NULL_VALUE):
+    '''
+    Returns a list of (index, record dict) from a merge_nsc output table
+    (list of lists with header). Blank cells are sent as null: for updates
+    the default clears the field (as update_enrollments.py does); if null is
+    None, blank cells are left out of the record (as is needed for inserts)
+    '''
+    header = table[0]
+    records = []
+    for row in table[1:]:
+        record = {}
+        index = ''
+        for field, value in zip(header, row): # some rows omit the Index
+            if field == INDEX:
+                index = value
+            else:
+                value = _sf_value(value, null)
+                if value is not None:
+                    record[field] = value
+        records.append((index, record))
+    return records
+
+def apply_tables(new_enr, enr_update, con_update, log_fn, dryrun=False,
+                 sf=None):
+    '''
+    Inserts new_enr and updates enr_update (Enrollment__c) and con_update
+    (Contact) in Salesforce and saves a log of every record to log_fn.
+    If dryrun is True, nothing is sent and the log shows what would be
+    '''
+    loads = [['New enrollments', 'Enrollment__c', 'insert',
+              table_to_records(new_enr, None)],
+             ['Enrollment updates', 'Enrollment__c', 'update',
+              table_to_records(enr_update)],
+             ['Contact flags', 'Contact', 'update',
+              table_to_records(con_update)],
+            ]
+    log = [['Table', 'Operation', INDEX, 'Id', 'Success', 'Errors']]
+    if not dryrun and not sf:
+        sf = ssf.getSF()
+    for name, obj_name, operation, records in loads:
+        print('%s: %d records to %s' % (name, len(records), operation))
+        if dryrun:
+            log.extend([[name, operation, index, record.get('Id', ''),
+                         'DRY RUN', ''] for index, record in records])
+            continue
+        if not records:
+            continue
+        start = time.perf_counter()
+        load = (ssfLoader.bulk_insert if operation == 'insert'
+                else ssfLoader.bulk_update)
+        responses, batches = load(sf, obj_name,
+                                  [record for index, record in records])
+        ssfLoader.print_summary(batches, time.perf_counter() - start)
+        for (index, record), response in zip(records, responses):
+            log.append([name, operation, index, response['id'],
+                        response['success'],
+                        '; '.join([str(x) for x in response['errors']])])
+    tt.table_to_csv(log_fn, log)
+    print('Write log saved to %s' % log_fn)
@@ -6,6 +6,7 @@ enrollment records from NSC or the database
 '''
 
 from datetime import date, datetime
+from concurrent.futures import ProcessPoolExecutor
 from botutils.tabletools import tableclass as tc
 from botutils.ADB import EnrollmentNamespace as e
 
@@ -47,32 +48,95 @@ def get_enrollments_and_chg_vartype(intake_raw, from_db=False):
     new_table.apply_func(e.Degree_Type__c, lambda x: None if x is '' else x)
     return new_table
 
+#---------Compact records used by the matching below-----------
+# Rows of the tables from get_enrollments_and_chg_vartype (with the Index
+# column added by merge_nsc) are turned into slotted records so the match
+# cases read named fields and each row carries no per-instance dict
+ENR_FIELDS = ('student', 'college', 'start_date', 'end_date',
+              'last_verified', 'status', 'degree_type', 'data_source',
+              'degree_text', 'major_text')
+
+class EnrollmentRecord():
+    ''' Base class for the enrollment records; subclasses list their fields
+    in table column order in both fields and __slots__ and unpack a table
+    row into them in __init__ '''
+    __slots__ = ()
+    fields = ()
+    def __repr__(self):
+        return repr(self.to_list())
+    def to_list(self):
+        '''Returns the record as a table row'''
+        return [getattr(self, field) for field in self.fields]
+
+class NSCEnrollment(EnrollmentRecord):
+    '''A row from the NSC enrollment table'''
+    fields = ENR_FIELDS + ('index',)
+    __slots__ = fields
+    def __init__(self, row):
+        (self.student, self.college, self.start_date, self.end_date,
+         self.last_verified, self.status, self.degree_type,
+         self.data_source, self.degree_text, self.major_text,
+         self.index) = row
+
+class DBEnrollment(EnrollmentRecord):
+    '''A row from the database enrollment table'''
+    fields = ENR_FIELDS + ('id', 'withdrawal_reason', 'withdrawal_code',
+                           'index')
+    __slots__ = fields
+    def __init__(self, row):
+        (self.student, self.college, self.start_date, self.end_date,
+         self.last_verified, self.status, self.degree_type,
+         self.data_source, self.degree_text, self.major_text,
+         self.id, self.withdrawal_reason, self.withdrawal_code,
+         self.index) = row
+
+class MatchRow():
+    ''' A row of the match table: the case plus the NSC and DB records that
+    it matched. Either record may be None (NSC only or DB only cases) '''
+    __slots__ = ('case', 'nsc', 'db')
+    def __init__(self, case, nsc=None, db=None):
+        self.case = case
+        self.nsc = nsc
+        self.db = db
+    def __repr__(self):
+        return repr(self.to_list())
+    def to_list(self):
+        '''Returns the case followed by the fields of each record present'''
+        row = [self.case]
+        if self.nsc is not None:
+            row.extend(self.nsc.to_list())
+        if self.db is not None:
+            row.extend(self.db.to_list())
+        return row
+
 def get_extra_correction(mr, school_type):
     '''Helper function to generate additional flags for badly formed
     database only enrollments'''
-    degree_check = db_only_degree_check(mr[6], school_type)
+    degree_check = db_only_degree_check(mr.db.degree_type, school_type)
     correction = ''
-    if degree_check != mr[6]:
+    if degree_check != mr.db.degree_type:
         correction = 'Changed Degree Type from '
-        correction += (mr[6] if mr[6] else '<blank>')+' to '+degree_check
-    if not mr[4]:
+        correction += (mr.db.degree_type if mr.db.degree_type
+                       else '<blank>') + ' to ' + degree_check
+    if not mr.db.last_verified:
         if correction: correction += ', '
         correction += 'Missing Date Last Verified'
     
-    if not mr[5]:
+    if not mr.db.status:
         if correction: correction += ', '
         correction += 'Missing Status'
-    elif mr[5] == 'Matriculating':
-        if mr[2]:
-            if (date.today() - mr[2]).days > 0:
+    elif mr.db.status == 'Matriculating':
+        if mr.db.start_date:
+            if (date.today() - mr.db.start_date).days > 0:
                 if correction: correction += ', '
                 correction += 'Matriculating enrollment set to start in'
-                correction += ' the past (' + mr[2].strftime('%b %Y)')
+                correction += ' the past ('
+                correction += mr.db.start_date.strftime('%b %Y)')
         else:
             if correction: correction += ', '
             correction += 'Missing Start Date'
 
-    if not mr[7]:
+    if not mr.db.data_source:
         if correction: correction += ', '
         correction += 'Missing Data Source'
 
@@ -130,81 +194,91 @@ def degree_check(db_degree_type, nsc_degree_type, school_type):
 
 def very_diff_start_date(mr, show_status=False):
     '''Helper function to assemble the flag notes for these cases'''
-    db_start = mr[13]
-    db_end = mr[14]
-    nsc_start = mr[2]
-    nsc_end = mr[3]
+    db_start = mr.db.start_date
+    db_end = mr.db.end_date
+    nsc_start = mr.nsc.start_date
+    nsc_end = mr.nsc.end_date
     phrase = 'Database has '
-    if show_status: phrase += (mr[16] if mr[16] else '<unknown>') + ' '
+    if show_status:
+        phrase += (mr.db.status if mr.db.status else '<unknown>') + ' '
     phrase += db_start.strftime('%m/%d/%y-') if db_start else '<unknown>-'
     phrase += db_end.strftime('%m/%d/%y') if db_end else 'present'
     phrase += ' and NSC has '
-    if show_status: phrase += mr[5] + ' '
+    if show_status: phrase += mr.nsc.status + ' '
     phrase += nsc_start.strftime('%m/%d/%y-')
     phrase += nsc_end.strftime('%m/%d/%y') if nsc_end else 'present'
     return phrase
 
 def mostly_nsc_enr_update(mr, acc_dict, tricky_SD=False):
     # Id, SD, ED, DLV, Status, DegreeType, Data Source, Degree_Text, Major_Text
+    nsc = mr.nsc
+    db = mr.db
     if tricky_SD:
-        if not mr[13]:
-            sd = mr[2]
+        if not db.start_date:
+            sd = nsc.start_date
         else:
-            if (mr[2] - mr[13]).days > 180:
-                sd = mr[13] # keep DB start date--enrollment probably under-
-                            # reported, e.g. for undocumented
+            if (nsc.start_date - db.start_date).days > 180:
+                sd = db.start_date # keep DB start date--enrollment probably
+                                   # under-reported, e.g. for undocumented
             else:
-                sd = mr[2]  # go with NSC start date, alum prob delayed start
+                sd = nsc.start_date # go with NSC start date, alum prob
+                                    # delayed start
     else:
-        sd = mr[2]
-    return [    mr[21],                 # Id
-                sd,                     # Start Date
-                mr[3],                  # End Date
-                mr[4],                  # Date Last Verified
-                mr[5],                  # Status
-                degree_check(mr[17],mr[6], acc_dict[mr[1]][1]),
-                mr[7],                  # Data Source
-                mr[8] if mr[8] else mr[19], # Degree Text
-                mr[9] if mr[9] else mr[20], # Major Text
-                mr[10], # Index
+        sd = nsc.start_date
+    return [    db.id,                  # Id
+                sd, # Start Date
+                nsc.end_date, # End Date
+                nsc.last_verified,      # Date Last Verified
+                nsc.status, # Status
+                degree_check(db.degree_type, nsc.degree_type,
+                             acc_dict[nsc.college][1]),
+                nsc.data_source,        # Data Source
+                nsc.degree_text if nsc.degree_text else db.degree_text,
+                nsc.major_text if nsc.major_text else db.major_text,
+                nsc.index, # Index
            ]
 
 def mostly_db_enr_update(mr, acc_dict, ed_from_nsc=False, tricky_SD=False):
     # Id, SD, ED, DLV, Status, DegreeType, Data Source, Degree_Text, Major_Text
+    nsc = mr.nsc
+    db = mr.db
     if tricky_SD:
-        if not mr[13]:
-            sd = mr[2]
+        if not db.start_date:
+            sd = nsc.start_date
         else:
-            if (mr[2] - mr[13]).days > 180:
-                sd = mr[13] # keep DB start date--enrollment probably under-
-                            # reported, e.g. for undocumented
+            if (nsc.start_date - db.start_date).days > 180:
+                sd = db.start_date # keep DB start date--enrollment probably
+                                   # under-reported, e.g. for undocumented
             else:
-                sd = mr[2]  # go with NSC start date, alum prob delayed start
+                sd = nsc.start_date # go with NSC start date, alum prob
+                                    # delayed start
     else:
-        sd = mr[2]
-    return [    mr[21],                 # Id
-                sd,                     # Start Date
-                mr[3] if ed_from_nsc else mr[14], # End Date
-                mr[15],                  # Date Last Verified
-                mr[16],                 # Status
-                degree_check(mr[17],mr[6], acc_dict[mr[1]][1]),
-                (mr[18] if mr[18]=='Transcript/Grade Report'
+        sd = nsc.start_date
+    return [    db.id,                  # Id
+                sd, # Start Date
+                nsc.end_date if ed_from_nsc else db.end_date, # End Date
+                db.last_verified,       # Date Last Verified
+                db.status, # Status
+                degree_check(db.degree_type, nsc.degree_type,
+                             acc_dict[nsc.college][1]),
+                (db.data_source if db.data_source=='Transcript/Grade Report'
                         else 'Coordinator Verified'),     # Data Source
-                mr[8] if mr[8] else mr[19], # Degree Text
-                mr[9] if mr[9] else mr[20], # Major Text
-                mr[10], # Index
+                nsc.degree_text if nsc.degree_text else db.degree_text,
+                nsc.major_text if nsc.major_text else db.major_text,
+                nsc.index, # Index
            ]
 
 def deg_con_flag(mr, acc_dict):
     '''helper function to do the flag for records that changed degree type
     but otherwise had no changes'''
-    new_deg = degree_check(mr[17],mr[6], acc_dict[mr[1]][1])
-    if new_deg != mr[17] and mr[17]:
-        flag_text = '<Changed>Changed enrollment type from ' +mr[17]
+    new_deg = degree_check(mr.db.degree_type, mr.nsc.degree_type,
+                           acc_dict[mr.nsc.college][1])
+    if new_deg != mr.db.degree_type and mr.db.degree_type:
+        flag_text = '<Changed>Changed enrollment type from ' +mr.db.degree_type
         flag_text += ' to ' + new_deg + ': '
-        flag_text += acc_dict[mr[1]][0]
-        flag_text += mr[2].strftime(' (%b %Y start)')
-        return [mr[0], True, flag_text, mr[10]]
+        flag_text += acc_dict[mr.nsc.college][0]
+        flag_text += mr.nsc.start_date.strftime(' (%b %Y start)')
+        return [mr.nsc.student, True, flag_text, mr.nsc.index]
     else:
         return None
 
@@ -226,7 +300,7 @@ class MatchCase():
     def __repr__(self):
         return self.name
 
-    # matched record consists of first the NSC table then the DB
+    # matched record is a MatchRow with the NSC record then the DB record
     def enr_update(self, mr, acc_dict):
         return None
     def new_enr(self, mr):
@@ -239,11 +313,11 @@ class MatchCase():
 # in order per the 'build_match_cases' function
 class PerfectMatch(MatchCase):
     def comp(self, db, nsc):
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         db[2] == nsc[2] and # Start Date
-                         db[3] == nsc[3] and # End Date
-                         db[5] == nsc[5]     # Status
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         db.start_date == nsc.start_date and # Start Date
+                         db.end_date == nsc.end_date and # End Date
+                         db.status == nsc.status # Status
                        ) else False
 
     def enr_update(self, mr, acc_dict):
@@ -255,13 +329,13 @@ class PerfectMatch(MatchCase):
 
 class PerfectMatchFuzzyStart(MatchCase):
     def comp(self, db, nsc):
-        if not db[2]: #makes sure the database has a non-blank start date
+        if not db.start_date: #makes sure the DB has a non-blank start date
             return False
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         db[3] == nsc[3] and # End Date
-                         db[5] == nsc[5] and # Status
-                         fuzzy_start_match(db[2], nsc[2]) # Start Date
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         db.end_date == nsc.end_date and # End Date
+                         db.status == nsc.status and # Status
+                         fuzzy_start_match(db.start_date, nsc.start_date)
                        ) else False
 
     def enr_update(self, mr, acc_dict):
@@ -273,13 +347,13 @@ class PerfectMatchFuzzyStart(MatchCase):
 #For all cases below here, it's assumed the end date doesn't exactly match
 class SCSt_GG_Match(MatchCase):
     def comp(self, db, nsc):
-        if not db[2]: #makes sure the database has a non-blank start date
+        if not db.start_date: #makes sure the DB has a non-blank start date
             return False
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         nsc[5] == 'Graduated' and # Status
-                         db[5] ==  'Graduated' and # Status
-                         fuzzy_start_match(db[2], nsc[2]) # Start Date
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         nsc.status == 'Graduated' and # Status
+                         db.status ==  'Graduated' and # Status
+                         fuzzy_start_match(db.start_date, nsc.start_date)
                        ) else False
 
     def enr_update(self, mr, acc_dict):
@@ -290,34 +364,35 @@ class SCSt_GG_Match(MatchCase):
 
 class SCSt_G_Other_Match(MatchCase):
     def comp(self, db, nsc):
-        if not db[2]: #makes sure the database has a non-blank start date
+        if not db.start_date: #makes sure the DB has a non-blank start date
             return False
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         nsc[5] == 'Graduated' and # Status
-                         db[5] !=  'Graduated' and # Status
-                         fuzzy_start_match(db[2], nsc[2]) # Start Date
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         nsc.status == 'Graduated' and # Status
+                         db.status !=  'Graduated' and # Status
+                         fuzzy_start_match(db.start_date, nsc.start_date)
                        ) else False
 
     def enr_update(self, mr, acc_dict):
         return mostly_nsc_enr_update(mr, acc_dict)
 
     def con_flag(self, mr, acc_dict):
-        flag_text = '<Changed>New unreported graduation (was ' +str(mr[16])+ '): '
-        flag_text += acc_dict[mr[1]][0]
-        flag_text += mr[3].strftime(' (%b %Y)')
-        return [mr[0], True, flag_text, mr[10]]
+        flag_text = '<Changed>New unreported graduation (was '
+        flag_text += str(mr.db.status) + '): '
+        flag_text += acc_dict[mr.nsc.college][0]
+        flag_text += mr.nsc.end_date.strftime(' (%b %Y)')
+        return [mr.nsc.student, True, flag_text, mr.nsc.index]
 
 class SCSt_A_TW_Match(MatchCase):
     def comp(self, db, nsc):
-        if not db[2]: #makes sure the database has a non-blank start date
+        if not db.start_date: #makes sure the DB has a non-blank start date
             return False
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         nsc[5] == 'Attending' and # Status
-                         (db[5] == 'Transferred out' or
-                          db[5] == 'Withdrew') and
-                         fuzzy_start_match(db[2], nsc[2]) # Start Date
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         nsc.status == 'Attending' and # Status
+                         (db.status == 'Transferred out' or
+                          db.status == 'Withdrew') and
+                         fuzzy_start_match(db.start_date, nsc.start_date)
                        ) else False
 
     def enr_update(self, mr, acc_dict):
@@ -325,24 +400,24 @@ class SCSt_A_TW_Match(MatchCase):
 
     def con_flag(self, mr, acc_dict):
         flag_text = '<Not changed>NSC indicates still attending '
-        flag_text += '(currently ' +mr[16]+ '): '
-        flag_text += acc_dict[mr[1]][0]
-        flag_text += mr[2].strftime(' (%b %Y start')
-        if mr[14]: # an actual end date was in the system
-            flag_text += mr[14].strftime(' currently %m/%d/%Y end)')
+        flag_text += '(currently ' +mr.db.status+ '): '
+        flag_text += acc_dict[mr.nsc.college][0]
+        flag_text += mr.nsc.start_date.strftime(' (%b %Y start')
+        if mr.db.end_date: # an actual end date was in the system
+            flag_text += mr.db.end_date.strftime(' currently %m/%d/%Y end)')
         else:
             flag_text += ')'
-        return [mr[0], True, flag_text, mr[10]]
+        return [mr.nsc.student, True, flag_text, mr.nsc.index]
 
 class SCSt_AA_Match(MatchCase):
     def comp(self, db, nsc):
-        if not db[2]: #makes sure the database has a non-blank start date
+        if not db.start_date: #makes sure the DB has a non-blank start date
             return False
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         nsc[5] == 'Attending' and # Status
-                         db[5] ==  'Attending' and # Status
-                         fuzzy_start_match(db[2], nsc[2]) # Start Date
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         nsc.status == 'Attending' and # Status
+                         db.status ==  'Attending' and # Status
+                         fuzzy_start_match(db.start_date, nsc.start_date)
                        ) else False
 
     def enr_update(self, mr, acc_dict):
@@ -353,55 +428,57 @@ class SCSt_AA_Match(MatchCase):
 
 class SCSt_A_G_Match(MatchCase):
     def comp(self, db, nsc):
-        if not db[2]: #makes sure the database has a non-blank start date
+        if not db.start_date: #makes sure the DB has a non-blank start date
             return False
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         nsc[5] == 'Attending' and # Status
-                         db[5] ==  'Graduated' and # Status
-                         fuzzy_start_match(db[2], nsc[2]) # Start Date
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         nsc.status == 'Attending' and # Status
+                         db.status ==  'Graduated' and # Status
+                         fuzzy_start_match(db.start_date, nsc.start_date)
                        ) else False
 
     def enr_update(self, mr, acc_dict):
         return mostly_db_enr_update(mr, acc_dict, ed_from_nsc=False)
 
     def con_flag(self, mr, acc_dict):
-        flag_text = '<Not changed>Graduation not confirmed ('+mr[5]+' in NSC): '
-        flag_text += acc_dict[mr[1]][0]
-        flag_text += mr[2].strftime(' (%b %Y start)')
-        return [mr[0], True, flag_text, mr[10]]
+        flag_text = '<Not changed>Graduation not confirmed ('
+        flag_text += mr.nsc.status + ' in NSC): '
+        flag_text += acc_dict[mr.nsc.college][0]
+        flag_text += mr.nsc.start_date.strftime(' (%b %Y start)')
+        return [mr.nsc.student, True, flag_text, mr.nsc.index]
 
 class SCSt_TW_G_Match(MatchCase):
     def comp(self, db, nsc):
-        if not db[2]: #makes sure the database has a non-blank start date
+        if not db.start_date: #makes sure the DB has a non-blank start date
             return False
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         (nsc[5] == 'Transferred out' or
-                          nsc[5] == 'Withdrew') and # Status
-                         db[5] ==  'Graduated' and # Status
-                         fuzzy_start_match(db[2], nsc[2]) # Start Date
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         (nsc.status == 'Transferred out' or
+                          nsc.status == 'Withdrew') and # Status
+                         db.status ==  'Graduated' and # Status
+                         fuzzy_start_match(db.start_date, nsc.start_date)
                        ) else False
 
     def enr_update(self, mr, acc_dict):
         return mostly_db_enr_update(mr, acc_dict, ed_from_nsc=True)
 
     def con_flag(self, mr, acc_dict):
-        flag_text = '<Not changed>Graduation not confirmed ('+mr[5]+' in NSC): '
-        flag_text += acc_dict[mr[1]][0]
-        flag_text += mr[2].strftime(' (%b %Y start)')
-        return [mr[0], True, flag_text, mr[10]]
+        flag_text = '<Not changed>Graduation not confirmed ('
+        flag_text += mr.nsc.status + ' in NSC): '
+        flag_text += acc_dict[mr.nsc.college][0]
+        flag_text += mr.nsc.start_date.strftime(' (%b %Y start)')
+        return [mr.nsc.student, True, flag_text, mr.nsc.index]
 
 class SCSt_TW_A_Match(MatchCase):
     def comp(self, db, nsc):
-        if not db[2]: #makes sure the database has a non-blank start date
+        if not db.start_date: #makes sure the DB has a non-blank start date
             return False
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         (nsc[5] == 'Transferred out' or
-                          nsc[5] == 'Withdrew') and # Status
-                         db[5] ==  'Attending' and # Status
-                         fuzzy_start_match(db[2], nsc[2]) # Start Date
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         (nsc.status == 'Transferred out' or
+                          nsc.status == 'Withdrew') and # Status
+                         db.status ==  'Attending' and # Status
+                         fuzzy_start_match(db.start_date, nsc.start_date)
                        ) else False
 
     def enr_update(self, mr, acc_dict):
@@ -409,21 +486,21 @@ class SCSt_TW_A_Match(MatchCase):
 
     def con_flag(self, mr, acc_dict):
         flag_text = '<Changed>New unreported left college: '
-        flag_text += acc_dict[mr[1]][0]
-        flag_text += mr[2].strftime(' (%b %Y start)')
-        return [mr[0], True, flag_text, mr[10]]
+        flag_text += acc_dict[mr.nsc.college][0]
+        flag_text += mr.nsc.start_date.strftime(' (%b %Y start)')
+        return [mr.nsc.student, True, flag_text, mr.nsc.index]
 
 class SCSt_TW_TW_Match(MatchCase):
     def comp(self, db, nsc):
-        if not db[2]: #makes sure the database has a non-blank start date
+        if not db.start_date: #makes sure the DB has a non-blank start date
             return False
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         (nsc[5] == 'Transferred out' or
-                          nsc[5] == 'Withdrew') and # Status
-                         (db[5] == 'Transferred out' or
-                          db[5] == 'Withdrew') and
-                         fuzzy_start_match(db[2], nsc[2]) # Start Date
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         (nsc.status == 'Transferred out' or
+                          nsc.status == 'Withdrew') and # Status
+                         (db.status == 'Transferred out' or
+                          db.status == 'Withdrew') and
+                         fuzzy_start_match(db.start_date, nsc.start_date)
                        ) else False
 
     def enr_update(self, mr, acc_dict):
@@ -435,14 +512,14 @@ class SCSt_TW_TW_Match(MatchCase):
 
 class SCSt_A_Matr_Match(MatchCase):
     def comp(self, db, nsc):
-        if not db[2]: #makes sure the database has a non-blank start date
+        if not db.start_date: #makes sure the DB has a non-blank start date
             return False
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         nsc[5] == 'Attending' and # Status
-                         (db[5] == 'Matriculating' or
-                          db[5] == 'Did not matriculate') and
-                         fuzzy_start_match(db[2], nsc[2]) # Start Date
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         nsc.status == 'Attending' and # Status
+                         (db.status == 'Matriculating' or
+                          db.status == 'Did not matriculate') and
+                         fuzzy_start_match(db.start_date, nsc.start_date)
                        ) else False
 
     def enr_update(self, mr, acc_dict):
@@ -450,23 +527,23 @@ class SCSt_A_Matr_Match(MatchCase):
 
     def con_flag(self, mr, acc_dict):
         flag_text = '<Not changed>NSC indicates actually enrolled '
-        flag_text += '(currently ' +mr[16]+ '): '
-        flag_text += acc_dict[mr[1]][0]
-        flag_text += mr[2].strftime(' (%b %Y start)')
-        return [mr[0], True, flag_text, mr[10]]
+        flag_text += '(currently ' +mr.db.status+ '): '
+        flag_text += acc_dict[mr.nsc.college][0]
+        flag_text += mr.nsc.start_date.strftime(' (%b %Y start)')
+        return [mr.nsc.student, True, flag_text, mr.nsc.index]
 
 
 class SCSt_TW_Matr_Match(MatchCase):
     def comp(self, db, nsc):
-        if not db[2]: #makes sure the database has a non-blank start date
+        if not db.start_date: #makes sure the DB has a non-blank start date
             return False
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         (nsc[5] == 'Transferred out' or
-                          nsc[5] == 'Withdrew') and # Status
-                         (db[5] == 'Matriculating' or
-                          db[5] == 'Did not matriculate') and
-                         fuzzy_start_match(db[2], nsc[2]) # Start Date
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         (nsc.status == 'Transferred out' or
+                          nsc.status == 'Withdrew') and # Status
+                         (db.status == 'Matriculating' or
+                          db.status == 'Did not matriculate') and
+                         fuzzy_start_match(db.start_date, nsc.start_date)
                        ) else False
 
     def enr_update(self, mr, acc_dict):
@@ -475,44 +552,45 @@ class SCSt_TW_Matr_Match(MatchCase):
     def con_flag(self, mr, acc_dict):
         flag_text = '<Not changed>NSC indicates actually enrolled then withdrew'
         
-        flag_text += ' (currently ' +mr[16]+ '): ' +acc_dict[mr[1]][0]
-        flag_text += mr[2].strftime(' (%b %Y start)')
-        return [mr[0], True, flag_text, mr[10]]
+        flag_text += ' (currently ' + mr.db.status + '): '
+        flag_text += acc_dict[mr.nsc.college][0]
+        flag_text += mr.nsc.start_date.strftime(' (%b %Y start)')
+        return [mr.nsc.student, True, flag_text, mr.nsc.index]
 
 
 class SCStMatch(MatchCase): # Temporary case to catch S/C/St matches
     def comp(self, db, nsc):
-        if not db[2]: #makes sure the database has a non-blank start date
+        if not db.start_date: #makes sure the DB has a non-blank start date
             return False
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         fuzzy_start_match(db[2], nsc[2]) # Start Date
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         fuzzy_start_match(db.start_date, nsc.start_date)
                        ) else False
 
 class SC_StatusMatch(MatchCase):
     def comp(self, db, nsc):
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         db[5] == nsc[5]      # Status
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         db.status == nsc.status # Status
                        ) else False
 
     def enr_update(self, mr, acc_dict):
         return mostly_nsc_enr_update(mr, acc_dict, tricky_SD=True)
 
     def con_flag(self, mr, acc_dict):
-        if mr[13]: # only flag if coordinator entered a start date
+        if mr.db.start_date: # only flag if coordinator entered a start date
             flag_text = '<Changed>Date discrepancy ('
             flag_text += very_diff_start_date(mr)
-            flag_text += '): ' +acc_dict[mr[1]][0]
-            return [mr[0], True, flag_text, mr[10]]
+            flag_text += '): ' +acc_dict[mr.nsc.college][0]
+            return [mr.nsc.student, True, flag_text, mr.nsc.index]
         else:
             return None
  
 class SC_anything_G_Match(MatchCase):
     def comp(self, db, nsc):
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         db[5] == 'Graduated'      # Status
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         db.status == 'Graduated' # Status
                        ) else False
 
     def enr_update(self, mr, acc_dict):
@@ -521,33 +599,34 @@ class SC_anything_G_Match(MatchCase):
 
     def con_flag(self, mr, acc_dict):
         flag_text = '<Not changed>Graduation not confirmed '
-        flag_text += '(NSC has ' + mr[5] + ')'
+        flag_text += '(NSC has ' + mr.nsc.status + ')'
         flag_text += ' and date discrepancy ('
         flag_text += very_diff_start_date(mr)
-        flag_text += '): ' +acc_dict[mr[1]][0]
-        return [mr[0], True, flag_text, mr[10]]
+        flag_text += '): ' +acc_dict[mr.nsc.college][0]
+        return [mr.nsc.student, True, flag_text, mr.nsc.index]
  
 class SC_G_anything_Match(MatchCase):
     def comp(self, db, nsc):
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1] and # College
-                         nsc[5] == 'Graduated'      # Status
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college and # College
+                         nsc.status == 'Graduated' # Status
                        ) else False
 
     def enr_update(self, mr, acc_dict):
         return mostly_nsc_enr_update(mr, acc_dict, tricky_SD=True)
 
     def con_flag(self, mr, acc_dict):
-        flag_text = '<Changed>New unreported graduation (was ' + mr[16] + ')'
+        flag_text = '<Changed>New unreported graduation (was '
+        flag_text += mr.db.status + ')'
         flag_text += ' and date discrepancy ('
         flag_text += very_diff_start_date(mr)
-        flag_text += '): ' +acc_dict[mr[1]][0]
-        return [mr[0], True, flag_text, mr[10]]
+        flag_text += '): ' +acc_dict[mr.nsc.college][0]
+        return [mr.nsc.student, True, flag_text, mr.nsc.index]
 
 class SCMatch(MatchCase): # Catch-all case that must come last
     def comp(self, db, nsc):
-        return True if ( db[0] == nsc[0] and # Student
-                         db[1] == nsc[1]     # College
+        return True if ( db.student == nsc.student and # Student
+                         db.college == nsc.college # College
                        ) else False
 
     def enr_update(self, mr, acc_dict):
@@ -556,8 +635,8 @@ class SCMatch(MatchCase): # Catch-all case that must come last
     def con_flag(self, mr, acc_dict):
         flag_text = '<Changed>Discrepancies ('
         flag_text += very_diff_start_date(mr, show_status=True)
-        flag_text += '): ' +acc_dict[mr[1]][0]
-        return [mr[0], True, flag_text, mr[10]]
+        flag_text += '): ' +acc_dict[mr.nsc.college][0]
+        return [mr.nsc.student, True, flag_text, mr.nsc.index]
 
 
 class NotInDB_status(MatchCase):
@@ -565,18 +644,18 @@ class NotInDB_status(MatchCase):
         self.name = name
         self.status = status
     def comp(self, db, nsc):
-        return True if (db[0] is None and # 
-                        nsc[5] == self.status
+        return True if (db.student is None and # 
+                        nsc.status == self.status
                         ) else False
 
     def new_enr(self, mr):
-        return mr[0:11]
+        return mr.nsc.to_list()
     def con_flag(self, mr, acc_dict):
         flag_text = '<Added>NSC indicates previously unreported enrollment ('
         flag_text += self.status + '): '
-        flag_text += acc_dict[mr[1]][0]
-        flag_text += mr[2].strftime(' (%b %Y start)')
-        return [mr[0], True, flag_text, mr[10]]
+        flag_text += acc_dict[mr.nsc.college][0]
+        flag_text += mr.nsc.start_date.strftime(' (%b %Y start)')
+        return [mr.nsc.student, True, flag_text, mr.nsc.index]
 
 #-------------end of the MatchCase subclasses------------------------
 def build_match_cases():
@@ -606,6 +685,41 @@ def build_match_cases():
             NotInDB_status('(NSC only) New withdrew enrollment', 'Withdrew'),
             ]
 
+class CaseTable():
+    ''' Compiled (decision table) form of the cases from build_match_cases.
+    Every comp above depends only on a few features of the (db, nsc) pair,
+    so the cases are evaluated once for each distinct set of features (on
+    the first pair seen with them) and saved as a bitmask with bit k set if
+    cases[k].comp was True. Later pairs with the same features only need a
+    dictionary lookup '''
+    def __init__(self, cases):
+        self.cases = cases
+        self.bits = [1 << k for k in range(len(cases))]
+        self.masks = {} # features: bitmask of the cases that match
+
+    def mask(self, db, nsc):
+        db_start = db.start_date
+        nsc_start = nsc.start_date
+        features = (db.student is None, # blank db record (NSC only)
+                    db.student == nsc.student, # Student
+                    db.college == nsc.college, # College
+                    not db_start,
+                    db_start == nsc_start, # Start Date
+                    db.end_date == nsc.end_date, # End Date
+                    (fuzzy_start_match(db_start, nsc_start) if
+                        db_start and nsc_start is not None else None),
+                    db.status, # Status
+                    nsc.status, # Status
+                   )
+        mask = self.masks.get(features)
+        if mask is None:
+            mask = 0
+            for bit, case in zip(self.bits, self.cases):
+                if case.comp(db, nsc):
+                    mask |= bit
+            self.masks[features] = mask
+        return mask
+
 #---------Cases for looking only at records with DB info not in NSC--------
 
 class OnlyInDB_ignoreDegreeType(MatchCase):
@@ -615,7 +729,7 @@ class OnlyInDB_ignoreDegreeType(MatchCase):
     def __repr__(self):
         return self.name
     def comp(self, db):
-        return (True if db[6] == self.degree_type else False)
+        return (True if db.degree_type == self.degree_type else False)
 
 class OnlyInDB_ignoreStatus(MatchCase):
     def __init__(self, name, status):
@@ -624,7 +738,7 @@ class OnlyInDB_ignoreStatus(MatchCase):
     def __repr__(self):
         return self.name
     def comp(self, db):
-        return (True if db[5] == self.status else False)
+        return (True if db.status == self.status else False)
 
 class OnlyInDB(MatchCase):
     def __init__(self, name, status):
@@ -633,36 +747,40 @@ class OnlyInDB(MatchCase):
     def __repr__(self):
         return self.name
     def comp(self, db):
-        return (True if db[5] == self.status else False)
+        return (True if db.status == self.status else False)
 
-    # matched record consists of first the NSC table then the DB
+    # matched record is a MatchRow with the NSC record then the DB record
     def enr_update(self, mr, acc_dict):
-        db_degree_type = mr[6]
-        new_degree = db_only_degree_check(db_degree_type, acc_dict[mr[1]][1])
+        db_degree_type = mr.db.degree_type
+        new_degree = db_only_degree_check(db_degree_type,
+                                          acc_dict[mr.db.college][1])
         if db_degree_type == new_degree:
             return None
         else:
-            return [mr[10],mr[2],mr[3],mr[4],mr[5],new_degree,
-                    mr[7],mr[8],mr[9]]
+            return [mr.db.id, mr.db.start_date, mr.db.end_date,
+                    mr.db.last_verified, mr.db.status, new_degree,
+                    mr.db.data_source, mr.db.degree_text, mr.db.major_text]
 
     def new_enr(self, mr):
         return None
 
     def con_flag(self, mr, acc_dict):
         flag_text = ''
-        if (mr[5] == 'Attending' or
-            mr[5] == 'Graduated' or
-            mr[5] == 'Withdrew' or
-            mr[5] == 'Transferred out'):
-            flag_text = '<Warning>'+mr[5] + ' enrollment not confirmed by NSC'
-        extra_correction = get_extra_correction(mr, acc_dict[mr[1]][1])
+        if (mr.db.status == 'Attending' or
+            mr.db.status == 'Graduated' or
+            mr.db.status == 'Withdrew' or
+            mr.db.status == 'Transferred out'):
+            flag_text = '<Warning>' + mr.db.status
+            flag_text += ' enrollment not confirmed by NSC'
+        extra_correction = get_extra_correction(mr, acc_dict[mr.db.college][1])
         if extra_correction:
             if flag_text: flag_text += ' and '
             flag_text += extra_correction
         if flag_text:
-            flag_text += ': ' + acc_dict[mr[1]][0]
-            flag_text += mr[2].strftime(' (%b %Y start)') if mr[2] else ''
-            return [mr[0], True, flag_text, mr[10]]
+            flag_text += ': ' + acc_dict[mr.db.college][0]
+            if mr.db.start_date:
+                flag_text += mr.db.start_date.strftime(' (%b %Y start)')
+            return [mr.db.student, True, flag_text, mr.db.id]
         else:
             return None
 
@@ -682,73 +800,172 @@ def build_db_only_cases():
                                   'Did not matriculate'),
            ]
 
-def find_matches(db_enr, nsc_enr):
-    ''' Main function for comparing the two tables (with columns as specified
-    in get_enr_field_list above) and then returning two dictionaries of the
-    matching cases. Dictionaries will have the table data index as the key
-    with a two item list--the matching case as item 0 and the index of the
-    second item (in the other table) as item 1'''
+def _match_students(nsc_by_student, db_by_student, match_cases,
+                    verbose=True):
+    ''' Helper function for find_matches that runs the match cases for
+    every student in nsc_by_student (a dictionary of student: nsc rows) and
+    returns the two maps and the match_table (as in find_matches). Rows
+    are NSCEnrollment and DBEnrollment records '''
     db_enr_map = {}
     nsc_enr_map = {}
     match_table = []
+    case_table = CaseTable(match_cases)
+    # for using to pass to MatchCases w/ db_null
+    db_blank = DBEnrollment([None]*len(DBEnrollment.fields))
 
-    match_cases = build_match_cases() # a list of MatchCase subclasses
-    db_only_cases = build_db_only_cases() # to be parsed separately
-
-    #Now for every student in the NSC table, look for matches
-    students = set(nsc_enr.get_column(e.Student__c))
-    print('Processing %d students.' % len(students))
     student_count = 0
-    for student in students:
+    for student, nsc_rows in nsc_by_student.items():
         student_count += 1
-        if student_count % 50 == 0: print('.',end='', flush=True)
-        if student_count % 500 == 0: print(student_count, flush=True)
+        if verbose:
+            if student_count % 50 == 0: print('.',end='', flush=True)
+            if student_count % 500 == 0: print(student_count, flush=True)
 
         # These are temporary lists that we'll pop rows off of
         # for every match (they'll be traversed backwards for this)
-        nsc_student = list(nsc_enr.get_match_rows(e.Student__c, student))
-        db_student = list(db_enr.get_match_rows(e.Student__c, student))
-        db_blank = [None]*10 # for using to pass to MatchCases w/ db_null
-        
-        for case in match_cases:
+        nsc_student = list(nsc_rows)
+        db_student = list(db_by_student.get(student, []))
+
+        # Bitmasks of the matching cases for every pair of rows: for each
+        # nsc row, a list by original db row position plus one for db_blank.
+        # These are popped alongside nsc_student and db_pos alongside
+        # db_student so the positions always line up
+        nsc_masks = [([case_table.mask(db, nsc) for db in db_student],
+                      case_table.mask(db_blank, nsc)) for nsc in nsc_student]
+        db_pos = list(range(len(db_student)))
+        student_mask = 0 # any case that matches at least one pair
+        for pair_masks, blank_mask in nsc_masks:
+            student_mask |= blank_mask
+            for mask in pair_masks:
+                student_mask |= mask
+
+        for case, bit in zip(match_cases, case_table.bits):
             if not nsc_student: # we've matched all the nsc rows
                 break; # move on to the next student
-            else:
+            elif student_mask & bit:
                 for i in reversed(range(len(nsc_student))):
+                    pair_masks, blank_mask = nsc_masks[i]
                     for j in reversed(range(len(db_student))): #maybe empty
-                        if case.comp(db_student[j],nsc_student[i]):
-                            nsc_index = nsc_student[i][-1]
-                            db_index = db_student[j][-1]
+                        if pair_masks[db_pos[j]] & bit:
+                            nsc_index = nsc_student[i].index
+                            db_index = db_student[j].index
                             db_enr_map[db_index] = [case, nsc_index]
                             nsc_enr_map[nsc_index] = [case, db_index]
-                            match_row = [case]
-                            match_row.extend(nsc_student.pop(i))
-                            match_row.extend(db_student.pop(j))
-                            match_table.append(match_row)
+                            match_table.append(MatchRow(case,
+                                    nsc_student.pop(i), db_student.pop(j)))
+                            nsc_masks.pop(i)
+                            db_pos.pop(j)
                             break;
                     else:
-                        if case.comp(db_blank,nsc_student[i]):
-                            nsc_index = nsc_student[i][-1]
+                        if blank_mask & bit:
+                            nsc_index = nsc_student[i].index
                             nsc_enr_map[nsc_index] = [case, None]
-                            match_row = [case]
-                            match_row.extend(nsc_student.pop(i))
-                            match_table.append(match_row)
+                            match_table.append(MatchRow(case,
+                                                        nsc_student.pop(i)))
+                            nsc_masks.pop(i)
 
+    return (db_enr_map, nsc_enr_map, match_table)
+
+def _match_shard(nsc_by_student, db_by_student):
+    ''' Process pool version of _match_students: the worker has its own
+    MatchCase instances, so cases are returned by their position in
+    build_match_cases and swapped back for the parent's instances '''
+    match_cases = build_match_cases()
+    position = {case: k for k, case in enumerate(match_cases)}
+    db_enr_map, nsc_enr_map, match_table = _match_students(nsc_by_student,
+                                        db_by_student, match_cases, False)
+    for enr_map in (db_enr_map, nsc_enr_map):
+        for index in enr_map:
+            enr_map[index][0] = position[enr_map[index][0]]
+    for row in match_table:
+        row.case = position[row.case]
+    return (db_enr_map, nsc_enr_map, match_table)
+
+def _match_shard_from_args(args):
+    '''Unpacks a single argument tuple for the process pool'''
+    return _match_shard(*args)
+
+def find_matches(db_enr, nsc_enr, processes=None):
+    ''' Main function for comparing the two tables (with columns as specified
+    in get_enr_field_list above) and then returning two dictionaries of the
+    matching cases. Dictionaries will have the table data index as the key
+    with a two item list--the matching case as item 0 and the index of the
+    second item (in the other table) as item 1. The match table that is
+    also returned has a MatchRow for every matched (or unmatched) record
+    If processes is more than 1, the students are split into that many
+    shards (contiguous runs of students) that are matched in parallel
+    processes; the results are combined in shard order, so they are the
+    same as for a single process'''
+    match_cases = build_match_cases() # a list of MatchCase subclasses
+    db_only_cases = build_db_only_cases() # to be parsed separately
 
-    print(student_count, flush=True)
+    #Group both tables by student in a single pass each so that every
+    #student's rows can be looked up without rescanning the tables
+    nsc_by_student = {}
+    for row in nsc_enr.rows():
+        record = NSCEnrollment(row)
+        nsc_by_student.setdefault(record.student, []).append(record)
+    db_records = [DBEnrollment(row) for row in db_enr.rows()]
+    db_by_student = {}
+    for record in db_records:
+        db_by_student.setdefault(record.student, []).append(record)
+
+    #Now for every student in the NSC table, look for matches
+    print('Processing %d students.' % len(nsc_by_student))
+    if not processes or processes < 2:
+        db_enr_map, nsc_enr_map, match_table = _match_students(
+                            nsc_by_student, db_by_student, match_cases)
+        print(len(nsc_by_student), flush=True)
+    else:
+        # Each shard only carries the rows for its own students
+        students = list(nsc_by_student)
+        size = -(-len(students) // processes) # rounded up
+        shard_args = []
+        for start in range(0, len(students), size):
+            shard = students[start:start+size]
+            shard_args.append(({s: nsc_by_student[s] for s in shard},
+                               {s: db_by_student[s] for s in shard
+                                                    if s in db_by_student}))
+        db_enr_map = {}
+        nsc_enr_map = {}
+        match_table = []
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for k, result in enumerate(executor.map(_match_shard_from_args,
+                                                    shard_args)):
+                shard_db_map, shard_nsc_map, shard_table = result
+                for index, (case, other) in shard_db_map.items():
+                    db_enr_map[index] = [match_cases[case], other]
+                for index, (case, other) in shard_nsc_map.items():
+                    nsc_enr_map[index] = [match_cases[case], other]
+                for row in shard_table:
+                    row.case = match_cases[row.case]
+                    match_table.append(row)
+                print('Finished shard %d of %d' % (k+1, len(shard_args)),
+                        flush=True)
 
     # Now pass through all the remaining enrollments from the database
     # that didn't match
-    db_only = [row for row in db_enr.rows() if row[-1] not in db_enr_map]
+    db_only = [row for row in db_records if row.index not in db_enr_map]
     print('Now passing through %d remaining db_only records.' % len(db_only))
-    for case in db_only_cases:
-        for i in reversed(range(len(db_only))):
-            if case.comp(db_only[i]):
-                db_index = db_only[i][-1]
-                db_enr_map[db_index] = [case, None]
-                match_row = [case]
-                match_row.extend(db_only.pop(i))
-                match_table.append(match_row)
+    # Each record belongs to the first db only case it matches. Those cases
+    # only look at status and degree type, so the first case is found once
+    # per combination of the two. Records are bucketed by case and added
+    # in case order (last record first, as when scanning each case in turn)
+    first_case = {} # (status, degree type): index of case or None
+    buckets = [[] for case in db_only_cases]
+    for row in db_only:
+        key = (row.status, row.degree_type)
+        if key not in first_case:
+            first_case[key] = None
+            for k, case in enumerate(db_only_cases):
+                if case.comp(row):
+                    first_case[key] = k
+                    break
+        if first_case[key] is not None:
+            buckets[first_case[key]].append(row)
+    for case, bucket in zip(db_only_cases, buckets):
+        for row in reversed(bucket):
+            db_enr_map[row.index] = [case, None]
+            match_table.append(MatchRow(case, db=row))
 
     return (db_enr_map, nsc_enr_map, match_table)
 
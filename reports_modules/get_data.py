@@ -3,17 +3,38 @@
 either from the database or from a text file'''
 
 from botutils.ADB import AlumniDatabaseInterface as aDBi
+from botutils.ADB import AccountNamespace as a
+from botutils.ADB import EnrollmentNamespace as e
 from botutils.tabletools import tabletools as tt
+from reports_modules import reduce_tables
 
-def get_SF():
+def _csv_percent(val):
+    '''Converts a csv percentage (e.g. '55.2') to a fraction, as
+    reduce_tables.fix_account_percentages does for the database tables'''
+    return float(val)/100.0 if val else None
+
+# Columns converted while reading the csv files in get_CSV
+enr_schema = {e.Start_Date__c: 'date', e.End_Date__c: 'date'}
+acc_schema = {a.X1st_year_retention_rate__c: _csv_percent,
+              a.X6_yr_completion_rate__c: _csv_percent,
+              a.X6_yr_minority_completion_rate__c: _csv_percent,
+              a.X6_yr_transfer_rate__c: _csv_percent,
+              a.X6_yr_minority_transfer_rate__c: _csv_percent}
+
+def get_SF(cache=False, refresh=False):
     '''The Analysis qualifier restricts the fields only to ones we will
-    likely need'''
+    likely need. If cache is True, a recent local snapshot is used in place
+    of a new pull (refresh forces a new pull that replaces the snapshot)'''
+    if cache or refresh:
+        return aDBi.grabThreeMainTables_Cached(refresh=refresh)
     return aDBi.grabThreeMainTables_Analysis()
 
 def get_CSV(c_fn, a_fn, e_fn):
     '''This will take whatever is given, but is presumably every field
-    in each table (so will need to be paired down'''
-    con = tt.grab_csv_table(c_fn)
-    acc = tt.grab_csv_table(a_fn)
-    enr = tt.grab_csv_table(e_fn)
+    in each table, so only the fields used by reduce_tables are kept (and
+    the dates and percentages are converted, so fix_account_percentages
+    must not be run on these tables) as the files are read'''
+    con = tt.grab_typed_csv_table(c_fn, columns=reduce_tables.con_fields)
+    acc = tt.grab_typed_csv_table(a_fn, acc_schema, reduce_tables.acc_fields)
+    enr = tt.grab_typed_csv_table(e_fn, enr_schema, reduce_tables.enr_fields)
     return (con, acc, enr)
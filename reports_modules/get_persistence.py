@@ -4,6 +4,7 @@ Includes Class for storing all persistence information about a student that is
 initialized by passing all the enrollment records for the student'''
 
 from datetime import date, datetime
+from concurrent.futures import ProcessPoolExecutor
 
 
 class Persistence():
@@ -13,18 +14,7 @@ class Persistence():
     def _create_check_dates(self, hs_class, end_date):
         '''internal function to create a list of dates used to pinpoint
         whether a student was or wasn't enrolled each term'''
-        self.check_dates = []
-        cur_year = hs_class
-        cur_date = date(cur_year, 10, 15)
-        while cur_date <= end_date:
-            self.check_dates.append(cur_date)
-            if cur_date.month == 10:
-                cur_year += 1
-                cur_date = date(cur_year, 1, 20)
-            elif cur_date.month == 1:
-                cur_date = date(cur_year, 8, 31)
-            else:
-                cur_date = date(cur_year, 10, 15)
+        self.check_dates = create_check_dates(hs_class, end_date)
 
     def _set_sem(self, sem, status, college, grad):
         '''Helper function for initializing summary variables'''
@@ -236,31 +226,8 @@ class Persistence():
         self.col_name_semester[sem] = col_data[0]
         self.col_nces_semester[sem] = col_data[2]
         self.col_type_semester[sem] = col_data[1]
-        if col_data[1] == '4 yr' or col_data[1] == '2 yr':
-            if not aa_h:
-                self.grad_rate_semester[sem] = col_data[3]
-                self.ret_rate_semester[sem] = col_data[7]
-                if col_data[1] == '2 yr' and col_data[5]:
-                    self.grad_rate_semester[sem] += col_data[5]/2.0
-            else:
-                self.grad_rate_semester[sem] = col_data[4]
-
-                if col_data[3] and col_data[4] and col_data[7]:
-                    gr_diff = col_data[3] - col_data[4] # aa/h disadvantage
-                    if (gr_diff/2 < col_data[7]) and (gr_diff > 0):
-                        self.ret_rate_semester[sem] = col_data[7] - gr_diff/2
-                    else:
-                        self.ret_rate_semester[sem] = col_data[7]
-
-                else: # one of the two grad rates is not defined
-                    self.ret_rate_semester[sem] = col_data[7]
-                
-                if col_data[1] == '2 yr' and col_data[6]:
-                    self.grad_rate_semester[sem] += col_data[6]/2.0
-                
-        else:
-            self.grad_rate_semester[sem] = 0.0
-            self.ret_rate_semester[sem] = 0.0
+        (self.grad_rate_semester[sem],
+         self.ret_rate_semester[sem]) = get_college_rates(col_data, aa_h)
 
 
     def give_simple_persistence(self, ba_only=False):
@@ -292,6 +259,55 @@ class Persistence():
                 len(self.check_dates)) +' semesters possible ' + str(
                         sum(self._enr_count)) + ' total enrolled'
 
+def create_check_dates(hs_class, end_date):
+    '''Returns a list of dates used to pinpoint whether a student was or
+    wasn't enrolled each term (10/15, 1/20 and 8/31 of each year starting
+    with the fall after hs_class and ending on or before end_date)'''
+    check_dates = []
+    cur_year = hs_class
+    cur_date = date(cur_year, 10, 15)
+    while cur_date <= end_date:
+        check_dates.append(cur_date)
+        if cur_date.month == 10:
+            cur_year += 1
+            cur_date = date(cur_year, 1, 20)
+        elif cur_date.month == 1:
+            cur_date = date(cur_year, 8, 31)
+        else:
+            cur_date = date(cur_year, 10, 15)
+    return check_dates
+
+def get_college_rates(col_data, aa_h):
+    '''Returns a tuple of (grad rate, retention rate) to use for a student
+    enrolled in the college described by col_data (a value of the account_d
+    dictionary described in set_grad_rates above)'''
+    if col_data[1] == '4 yr' or col_data[1] == '2 yr':
+        if not aa_h:
+            grad_rate = col_data[3]
+            ret_rate = col_data[7]
+            if col_data[1] == '2 yr' and col_data[5]:
+                grad_rate += col_data[5]/2.0
+        else:
+            grad_rate = col_data[4]
+
+            if col_data[3] and col_data[4] and col_data[7]:
+                gr_diff = col_data[3] - col_data[4] # aa/h disadvantage
+                if (gr_diff/2 < col_data[7]) and (gr_diff > 0):
+                    ret_rate = col_data[7] - gr_diff/2
+                else:
+                    ret_rate = col_data[7]
+
+            else: # one of the two grad rates is not defined
+                ret_rate = col_data[7]
+            
+            if col_data[1] == '2 yr' and col_data[6]:
+                grad_rate += col_data[6]/2.0
+            
+    else:
+        grad_rate = 0.0
+        ret_rate = 0.0
+    return (grad_rate, ret_rate)
+
 def is_real_enr(status):
     '''Returns a boolean on whether it's a status code we care about'''
     return ( status == 'Attending' or
@@ -322,21 +338,65 @@ def is_AAH(race_eth):
             race_eth == 'Native American' or
             race_eth == 'Pacific Islander')
 
-def create_classes(con, acc, enr, end_date):
-    '''Returns a dictionary of Persistence records--one per student'''
+def _create_shard(students, enr_by_student, end_date, account_d):
+    '''Returns a dictionary of Persistence records for the list of contact
+    rows in students. enr_by_student is a dictionary with key=student id of
+    lists of enrollments (in the format expected by Persistence)'''
     per_stats = {}
-    account_d = acc.create_dict_list('Id',
-                                     ['Name', 'College Type','NCESid',
-                                      '6 yr grad', '6 yr grad AA/H',
-                                      '6 yr transfer', '6 yr transfer AA/H',
-                                      '1st yr retention'])
-    for student in con:
-        student_enr = [i[2:] for i in enr if i[1] == student[0]]
+    for student in students:
+        student_enr = enr_by_student.get(student[0], [])
         student_AAH = is_AAH(student[3])
         per_stats[student[0]] = Persistence(int(student[9]), # HS Class
                                             student_AAH,
                                             end_date,
                                             student_enr,
                                             account_d)
-
     return per_stats
+
+def _create_shard_from_args(args):
+    '''Unpacks a single argument tuple for the process pool'''
+    return _create_shard(*args)
+
+def create_classes(con, acc, enr, end_date, processes=None, engine='python'):
+    '''Returns a dictionary of Persistence records--one per student
+    If processes is more than 1, the students are split into one shard per
+    HS Class and the shards are worked on in that many parallel processes.
+    If engine is 'numpy', each HS Class is instead computed all at once by
+    the persistence_grid module (and processes is ignored)'''
+    account_d = acc.create_dict_list('Id',
+                                     ['Name', 'College Type','NCESid',
+                                      '6 yr grad', '6 yr grad AA/H',
+                                      '6 yr transfer', '6 yr transfer AA/H',
+                                      '1st yr retention'])
+
+    # Bucket the enrollments by student in a single pass
+    enr_by_student = {}
+    for student_id, rows in enr.build_index('Student').items():
+        enr_by_student[student_id] = [i[2:] for i in rows]
+
+    if engine == 'numpy':
+        from . import persistence_grid # NumPy is only needed for this engine
+        return persistence_grid.create_grid_classes(con, enr_by_student,
+                                                    end_date, account_d)
+
+    if not processes or processes < 2:
+        return _create_shard(list(con), enr_by_student, end_date, account_d)
+
+    # Each shard only carries the enrollments for its own students
+    shards = {}
+    for student in con:
+        if student[9] not in shards:
+            shards[student[9]] = [[], {}]
+        shards[student[9]][0].append(student)
+        if student[0] in enr_by_student:
+            shards[student[9]][1][student[0]] = enr_by_student[student[0]]
+    shard_args = [(students, shard_enr, end_date, account_d)
+                    for students, shard_enr in shards.values()]
+
+    shard_stats = {}
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for result in executor.map(_create_shard_from_args, shard_args):
+            shard_stats.update(result)
+
+    # Return in the same (contact) order as the single process version
+    return {student[0]: shard_stats[student[0]] for student in con}
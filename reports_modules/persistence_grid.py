@@ -0,0 +1,276 @@
+#!python3
+'''Alternate engine for determining college persistence that works on a
+whole HS class at once. Each class is represented as a grid of students x
+check dates (using the same check dates as get_persistence.Persistence)
+and all of the enrollment, graduation and summary fields are computed
+with NumPy array operations instead of per student loops. The results are
+handed back as GridPersistence objects that have the same fields and
+accessors as Persistence, so the report modules work with either one.'''
+
+import numpy as np
+from . import get_persistence as gp
+
+# Degree type codes for the enrollment arrays
+BA, MS, AA, TRADE, OTHER = 0, 1, 2, 3, -1
+DEGREE_CODES = {"Bachelor's": BA,
+                "Master's": MS,
+                "Associate's": AA,
+                "Associate's or Certificate (TBD)": AA,
+                'Certificate': TRADE,
+                'Trade/Vocational': TRADE,
+                }
+
+# Status codes for the summary grids (index into STATUS_LABELS); the
+# layers are listed from least to most important as in Persistence
+STATUS_LABELS = ['Trade/Vocational', 'Trade Degree',
+                 "Associate's", '2yr Degree',
+                 "Bachelor's", '4yr Degree',
+                 "Master's", 'Grad Degree']
+LAYERS = [  # (degree code, is graduation, status code)
+          (TRADE, False, 0), (TRADE, True, 1),
+          (AA, False, 2), (AA, True, 3),
+          (BA, False, 4), (BA, True, 5),
+          (MS, False, 6), (MS, True, 7),
+          ]
+IN_COLLEGE = 'In college/graduated'
+NOT_IN_COLLEGE = 'Not in college'
+
+class GridPersistence(gp.Persistence):
+    '''Persistence record for a single student with fields that were
+    already computed for the student's whole class by create_grid_classes
+    (so __init__ just stores them)'''
+    def __init__(self, hs_class, aa_h, check_dates, fields):
+        self.grad_yr = hs_class
+        self.is_aa_h = aa_h
+        self.check_dates = check_dates
+        self.semesters = len(check_dates)
+        for name in fields:
+            setattr(self, name, fields[name])
+
+def _lookup(values):
+    '''Returns an object array of values with a trailing None so that a
+    code of -1 looks up None'''
+    table = np.empty(len(values)+1, dtype=object)
+    table[:-1] = values
+    table[-1] = None
+    return table
+
+def _student_segments(e_student):
+    '''Enrollments are stored grouped by student, so this returns the index
+    of the first enrollment of each student with any enrollments and the
+    students they belong to (for use with ufunc.reduceat)'''
+    if not len(e_student):
+        return (np.zeros(0, dtype=np.int64), e_student)
+    starts = np.flatnonzero(np.diff(e_student, prepend=-1))
+    return (starts, e_student[starts])
+
+def _last_index_grid(mask, segments, num_students):
+    '''Takes an enrollments x dates boolean mask and returns a students x
+    dates grid with the index of the last enrollment (in list order) that
+    is True for each student and date or -1 if there isn't one. Taking
+    the last one mirrors Persistence, where later enrollments overwrite
+    earlier ones'''
+    grid = np.full((num_students, mask.shape[1]), -1, dtype=np.int64)
+    starts, owners = segments
+    if len(starts):
+        e_index = np.arange(mask.shape[0])[:, None]
+        grid[owners] = np.maximum.reduceat(np.where(mask, e_index, -1),
+                                           starts, axis=0)
+    return grid
+
+def _fix_persist_fields(sem):
+    '''Vectorized version of Persistence.fix_persist_fields'''
+    r_map = np.array([1, 2, 2])
+    return np.where(sem == -1, 0, (sem//3)*2 + r_map[sem % 3])
+
+def _first_true(grid):
+    '''Returns the first column index that is True in each row of grid or
+    the number of columns if there isn't one'''
+    if grid.shape[1] == 0:
+        return np.zeros(grid.shape[0], dtype=np.int64)
+    return np.where(grid.any(axis=1), grid.argmax(axis=1), grid.shape[1])
+
+def _create_class(hs_class, students, enr_by_student, end_date, account_d):
+    '''Returns a dictionary of GridPersistence records for a list of contact
+    rows (students) that all have the same HS Class'''
+    check_dates = gp.create_check_dates(hs_class, end_date)
+    num_students = len(students)
+    num_dates = len(check_dates)
+    ords = np.array([d.toordinal() for d in check_dates], dtype=np.int64)
+
+    # Flatten the enrollments for the class into parallel arrays with
+    # colleges stored as codes (-1 for a blank college)
+    college_codes = {}
+    e_student, e_college, e_degree = [], [], []
+    e_start, e_end, e_real, e_grad = [], [], [], []
+    for i, student in enumerate(students):
+        for enr in enr_by_student.get(student[0], []):
+            e_student.append(i)
+            if enr[0]:
+                if enr[0] not in college_codes:
+                    college_codes[enr[0]] = len(college_codes)
+                e_college.append(college_codes[enr[0]])
+            else:
+                e_college.append(-1)
+            e_degree.append(DEGREE_CODES.get(enr[1], OTHER))
+            e_start.append(enr[2].toordinal() if enr[2] else -1)
+            e_end.append(enr[3].toordinal() if enr[3] else -1)
+            e_real.append(gp.is_real_enr(enr[4]))
+            e_grad.append(enr[4] == 'Graduated' and bool(enr[3]))
+    e_student = np.array(e_student, dtype=np.int64)
+    e_college = np.array(e_college, dtype=np.int64)
+    e_degree = np.array(e_degree, dtype=np.int64)
+    e_start = np.array(e_start, dtype=np.int64)[:, None]
+    e_end = np.array(e_end, dtype=np.int64)[:, None]
+    e_real = np.array(e_real, dtype=bool)[:, None]
+    e_grad = np.array(e_grad, dtype=bool)[:, None]
+    colleges = _lookup(list(college_codes))
+    e_college = np.append(e_college, -1) # so index -1 gives a blank college
+
+    # enrollments x dates grids of enrolled and graduated-by
+    enrolled = (e_real & (e_start != -1) & (e_start <= ords) &
+                ((e_end == -1) | (ords <= e_end)))
+    graduated = e_grad & (ords >= e_end)
+
+    segments = _student_segments(e_student)
+    enr_count = np.zeros((num_students, num_dates), dtype=np.int64)
+    if len(segments[0]):
+        enr_count[segments[1]] = np.add.reduceat(enrolled.astype(np.int64),
+                                                 segments[0], axis=0)
+
+    # Layer the enrollments and graduations from least to most important
+    status = np.full((num_students, num_dates), -1, dtype=np.int64)
+    college = np.full((num_students, num_dates), -1, dtype=np.int64)
+    grad_status = np.full((num_students, num_dates), -1, dtype=np.int64)
+    grad_college = np.full((num_students, num_dates), -1, dtype=np.int64)
+    layer_colleges = {}
+    for degree, is_grad, status_code in LAYERS:
+        mask = (graduated if is_grad else enrolled) & (
+                                            e_degree == degree)[:, None]
+        layer = e_college[_last_index_grid(mask, segments, num_students)]
+        layer_colleges[(degree, is_grad)] = layer
+        present = layer != -1
+        status[present] = status_code
+        college[present] = layer[present]
+        if is_grad:
+            grad_status[present] = status_code
+            grad_college[present] = layer[present]
+
+    in_4yr = (np.isin(grad_status, [5, 7]) | np.isin(status, [4, 6]))
+    in_2yr = (grad_status == 3) | (status == 2)
+    simple_labels = _lookup([NOT_IN_COLLEGE, IN_COLLEGE])
+    simple_status = simple_labels[(in_4yr | in_2yr).astype(np.int64)]
+    simple_4yr_status = simple_labels[in_4yr.astype(np.int64)]
+
+    # Grad rates use the college of the highest status unless the student
+    # has graduated from that college
+    aa_h = np.array([gp.is_AAH(student[3]) for student in students],
+                    dtype=bool)
+    is_grad_col = (college != -1) & (grad_college == college)
+    attending = (college != -1) & ~is_grad_col
+    rate_key = college*2 + aa_h[:, None].astype(np.int64)
+    keys = np.unique(rate_key[attending])
+    key_index = np.full(2*len(college_codes)+1, -1, dtype=np.int64)
+    key_index[keys] = np.arange(len(keys))
+    names, nces, types, grad_rates, ret_rates = [], [], [], [], []
+    for key in keys.tolist():
+        col_data = account_d[colleges[key//2]]
+        names.append(col_data[0])
+        nces.append(col_data[2])
+        types.append(col_data[1])
+        rates = gp.get_college_rates(col_data, key % 2)
+        grad_rates.append(rates[0])
+        ret_rates.append(rates[1])
+    key_grid = np.where(attending, key_index[np.where(attending, rate_key,
+                                                      -1)], -1)
+    col_name = _lookup(names)[key_grid]
+    col_nces = _lookup(nces)[key_grid]
+    col_type = _lookup(types)[key_grid]
+    col_type[is_grad_col] = 'Grad'
+    grad_rate = _lookup(grad_rates)[key_grid]
+    grad_rate[is_grad_col] = 1.0
+    ret_rate = _lookup(ret_rates)[key_grid]
+    ret_rate[is_grad_col] = 1.0
+
+    # Persistence at the first college: it continues while each date has
+    # the same college and ends at the first 4yr graduation
+    grad_4yr = layer_colleges[(BA, True)]
+    has_4yr = grad_4yr != -1
+    earned_BA_in_sem = _first_true(has_4yr)
+    earned_BA_in_sem[earned_BA_in_sem == num_dates] = -1
+    if num_dates:
+        first_col = college[:, 0]
+        has_first = first_col != -1
+        breaks = has_4yr | (college != first_col[:, None])
+        breaks[:, 0] = False
+        first_break = _first_true(breaks)
+        break_row = np.minimum(first_break, num_dates-1)
+        rows = np.arange(num_students)
+        grad_same = (has_4yr[rows, break_row] &
+                     (grad_4yr[rows, break_row] == first_col))
+        persist = np.where(first_break == num_dates, num_dates-1,
+                           np.where(grad_same, first_break, first_break-1))
+        persist = np.where(has_4yr[:, 0], 0, persist)
+        persist = np.where(has_first, persist, -1)
+        persist_true = has_first & ~has_4yr[:, 0] & (first_break == num_dates)
+        persist_col = colleges[first_col]
+        last = {key: (layer_colleges[key][:, -1] != -1) for key in
+                [(BA, True), (AA, True), (TRADE, True)]}
+    else:
+        persist = np.full(num_students, -1, dtype=np.int64)
+        persist_true = np.zeros(num_students, dtype=bool)
+        persist_col = [None]*num_students
+        last = {key: persist_true for key in
+                [(BA, True), (AA, True), (TRADE, True)]}
+    persist = _fix_persist_fields(persist)
+    earned_BA_in_sem = _fix_persist_fields(earned_BA_in_sem)
+
+    # Finally, convert the grids to per student lists (whole grids at a
+    # time, which is much faster than converting row by row)
+    status_labels = _lookup(STATUS_LABELS)
+    grids = {'status_semester': status_labels[status],
+             'college_semester': colleges[college],
+             'grad_status_semester': status_labels[grad_status],
+             'grad_college_semester': colleges[grad_college],
+             'col_name_semester': col_name,
+             'col_nces_semester': col_nces,
+             'col_type_semester': col_type,
+             'grad_rate_semester': grad_rate,
+             'ret_rate_semester': ret_rate,
+             'simple_status': simple_status,
+             'simple_4yr_status': simple_4yr_status,
+             'persist_through_sem': persist,
+             'persist_true': persist_true,
+             'persist_col': np.asarray(persist_col, dtype=object),
+             'earned_BA_in_sem': earned_BA_in_sem,
+             'has_grad_4yr': last[(BA, True)],
+             'has_grad_2yr': last[(AA, True)],
+             'has_trade': last[(TRADE, True)],
+             '_enr_count': enr_count,
+             }
+    grids = {name: grids[name].tolist() for name in grids}
+    aa_h = aa_h.tolist()
+    per_stats = {}
+    for i, student in enumerate(students):
+        fields = {name: grids[name][i] for name in grids}
+        per_stats[student[0]] = GridPersistence(hs_class, aa_h[i],
+                                                check_dates, fields)
+    return per_stats
+
+def create_grid_classes(con, enr_by_student, end_date, account_d):
+    '''Returns a dictionary of GridPersistence records--one per student.
+    enr_by_student is a dictionary with key=student id of lists of
+    enrollments (in the format expected by Persistence)'''
+    classes = {}
+    for student in con:
+        if student[9] not in classes:
+            classes[student[9]] = []
+        classes[student[9]].append(student)
+
+    class_stats = {}
+    for hs_class in classes:
+        class_stats.update(_create_class(int(hs_class), classes[hs_class],
+                                         enr_by_student, end_date, account_d))
+
+    # Return in the same (contact) order as get_persistence.create_classes
+    return {student[0]: class_stats[student[0]] for student in con}
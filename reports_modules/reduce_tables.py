@@ -6,8 +6,9 @@ from botutils.ADB import AccountNamespace as a
 from botutils.ADB import EnrollmentNamespace as e
 from botutils.tabletools import tabletools as tt
 from botutils.tabletools import tableclass as tc
+from botutils.tabletools import columntable as ct
 from botutils.tkintertools import tktools
-from datetime import datetime
+from datetime import date, datetime
 
 '''The following three pairs of lists specify the final fields we want
 to keep in our main tables and their new names for all functions below
@@ -81,7 +82,9 @@ con_names =  [  'Id',               #0
 
 def strYYYY_MM_DD_to_date(val):
     '''Helper function to convert a 'YYYY-MM-DD' string to a date'''
-    if val: #checks for None or ''; will convert '' to None
+    if isinstance(val, date): # already converted (e.g. by get_data.get_CSV)
+        return val
+    elif val: #checks for None or ''; will convert '' to None
         return datetime.strptime(val, '%Y-%m-%d').date()
     else:
         return None
@@ -100,33 +103,37 @@ def specify_high_schools(raw_con, hs):
         tt.add_header(raw_con, hc)
         return hs_list
 
-def remove_extra_rows_and_columns(raw_con, raw_acc, raw_enr, hs_set):
+def remove_extra_rows_and_columns(raw_con, raw_acc, raw_enr, hs_set,
+                                  columnar=False):
     '''Does what it says: First limits the number of entries based on the
     High Schools covered and then reduces the columns of data in each
-    table prior to returning a Table class'''
+    table prior to returning a Table class (or a ColumnTable if columnar)'''
+    table_class = ct.ColumnTable if columnar else tc.Table
     # First reduce rows in the contact table
     hc = tt.slice_header(raw_con)
     con_in_hs = [x for x in raw_con if x[hc[c.High_School__c]] in hs_set]
     student_set = set([x[hc[c.Id]] for x in con_in_hs]) # for enr
     tt.add_header(con_in_hs, hc)
-    big_con = tc.Table(con_in_hs)
+    big_con = table_class(con_in_hs, copy=False)
 
     # Second reduce rows in enrollment table
     he = tt.slice_header(raw_enr)
     enr_in_hs = [x for x in raw_enr if x[he[e.Student__c]] in student_set]
     college_set = set([x[he[e.College__c]] for x in enr_in_hs]) # for acc
     tt.add_header(enr_in_hs, he)
-    big_enr = tc.Table(enr_in_hs)
+    big_enr = table_class(enr_in_hs, copy=False)
 
     # Third reduce rows in the accounts table
     ha = tt.slice_header(raw_acc)
     acc_in_hs = [x for x in raw_acc if x[ha[a.Id]] in college_set]
     tt.add_header(acc_in_hs, ha)
-    big_acc = tc.Table(acc_in_hs)
+    big_acc = table_class(acc_in_hs, copy=False)
 
     # Finally, use the lists defined at the top of this file to reduce the
     # number of columns (this step is necessary so that users that supply
-    # a CSV file don't need to supply the exact right columns
+    # a CSV file don't need to supply the exact right columns. The tables
+    # above share the raw rows and the reduced tables are views of them,
+    # so each row is only copied once, when the reduced table is changed
     little_con = big_con.new_subtable(con_fields, con_names)
     little_acc = big_acc.new_subtable(acc_fields, acc_names)
     little_enr = big_enr.new_subtable(enr_fields, enr_names)
@@ -10,13 +10,18 @@ from reports_modules import get_data, reduce_tables, get_persistence
 from reports_modules import create_report
 from datetime import date
 
-def main(infiles,outf,hs,by_hs,verbose):
+def main(infiles,outf,hs,by_hs,verbose,processes=None,engine='python',
+         cache=False,refresh=False,columnar=False):
     '''Main control flow for generating reports'''
     print('-'*40)
     if infiles:
         print('Contacts file is %s' % infiles[0])
         print('Accounts file is %s' % infiles[1])
         print('Enrollments file is %s' % infiles[2])
+    elif refresh:
+        print('Will load data from Salesforce and refresh the local snapshot')
+    elif cache:
+        print('Will load data from a local snapshot (if recent)')
     else:
         print('Will load data from Salesforce')
     print('Output file is %s' % outf)
@@ -25,6 +30,11 @@ def main(infiles,outf,hs,by_hs,verbose):
     else:
         print('Report will be generated for all high schools')
     if not by_hs: print('Will report in summary mode')
+    if columnar: print('Will store tables by column')
+    if engine == 'numpy':
+        print('Will analyze persistence with the NumPy engine')
+    elif processes:
+        print('Will analyze persistence with %d processes' % processes)
     print('-'*40)
 
     # First get the raw data (this will need to be paired down):
@@ -33,19 +43,21 @@ def main(infiles,outf,hs,by_hs,verbose):
     if infiles:
         raw_c_a_e = get_data.get_CSV(*infiles)
     else:
-        raw_c_a_e = get_data.get_SF()
+        raw_c_a_e = get_data.get_SF(cache, refresh)
 
     # Next pair down into Tables with only the columns we need
     print('Reducing data into smaller tables')
     hs_list = reduce_tables.specify_high_schools(raw_c_a_e[0], hs)
     print('Working with these high schools: %s' % str(hs_list))
     c_a_e = reduce_tables.remove_extra_rows_and_columns(*raw_c_a_e,
-                                                        hs_set=set(hs_list))
+                                                        hs_set=set(hs_list),
+                                                        columnar=columnar)
     print('Contacts: %d' % len(c_a_e[0]))
     print('Accounts: %d' % len(c_a_e[1]))
     #From this point on functions will use new human-readable names for columns
     reduce_tables.fix_enrollment_dates(c_a_e[2])
-    reduce_tables.fix_account_percentages(c_a_e[1])
+    if not infiles: # get_CSV already converted the csv percentages
+        reduce_tables.fix_account_percentages(c_a_e[1])
     reduce_tables.simplify_college_types(c_a_e[1])
     
     print('Enrollments: %d' % len(c_a_e[2]))
@@ -54,7 +66,9 @@ def main(infiles,outf,hs,by_hs,verbose):
     # Create persistence classes for each student
     print('Analyzing persistence for each student')
     end_date = date.today() # date after which enrollments assumed invalid
-    per_stats = get_persistence.create_classes(*c_a_e, end_date=end_date)
+    per_stats = get_persistence.create_classes(*c_a_e, end_date=end_date,
+                                               processes=processes,
+                                               engine=engine)
 
     print('-'*40)
 
@@ -99,7 +113,29 @@ if __name__ == '__main__':
     out_help='Output filename (xlsx)'
     parser.add_argument('-out', dest='out', action='store', help=out_help)
 
+    proc_help='Number of processes to use for the persistence analysis'
+    parser.add_argument('-processes', dest='processes', type=int,
+                                                help=proc_help)
+
+    numpy_help='Analyze persistence with the NumPy (whole class) engine'
+    parser.add_argument('-numpy', dest='numpy', action='store_true',
+                                                help=numpy_help)
+
+    cache_help='Use a recent local snapshot of the database (implies -db)'
+    parser.add_argument('-cache', dest='cache', action='store_true',
+                                                help=cache_help)
+
+    refresh_help='Refresh the local snapshot of the database (implies -db)'
+    parser.add_argument('-refresh', dest='refresh', action='store_true',
+                                                help=refresh_help)
+
+    columnar_help='Store the reduced tables by column (uses less memory)'
+    parser.add_argument('-columnar', dest='columnar', action='store_true',
+                                                help=columnar_help)
+
     args = parser.parse_args()
+    if args.cache or args.refresh:
+        args.db = True
 
     arg_dict = {}
     if not args.out:
@@ -133,5 +169,7 @@ if __name__ == '__main__':
         infiles = None
     else:
         infiles = (args.con, args.acc, args.enr)
-    main(infiles,args.out,args.hs, by_hs, args.verbose)
+    main(infiles,args.out,args.hs, by_hs, args.verbose, args.processes,
+         'numpy' if args.numpy else 'python', args.cache, args.refresh,
+         args.columnar)
     #s = input('----(hit enter to close)----')
@@ -0,0 +1,96 @@
+'''
+Regression test for the DB only pass of enrollment_match.find_matches:
+the records left over after matching against NSC are classified by the
+original per-case scan (kept below as the reference) and the match table
+and db_enr_map must come out exactly the same
+'''
+from datetime import date
+
+from botutils.tabletools import tableclass as tc
+from nsc_modules import enrollment_match as em
+
+START = date(2016, 8, 20)
+END = date(2020, 5, 15)
+
+# (student, status, degree type) for the database rows; every db only case
+# is covered (most by more than one row, so their order is checked too),
+# as are rows that match more than one case (the first case wins) and
+# rows that match none
+DB_ROWS = [
+    ('S1', 'Graduated', "Bachelor's"), # matched with NSC below
+    ('S1', 'Attending', 'Employment'), # Employment and Attending
+    ('S2', 'Withdrew', "Associate's"),
+    ('S2', None, 'Trade/Vocational'), # Trade/Vocational and <empty status>
+    ('S3', 'Attending', "Bachelor's"),
+    ('S3', 'Did not matriculate', 'Certificate'), # Certificate and DNM
+    ('S4', 'Transferred out', "Bachelor's"),
+    ('S4', 'Deferred', "Bachelor's"), # no db only case
+    ('S5', 'Matriculating', "Bachelor's"),
+    ('S5', 'Graduated', "Associate's"),
+    ('S6', None, None),
+    ('S6', 'Did not matriculate', "Bachelor's"),
+    ('S7', 'Employment', 'Employment'),
+    ('S7', 'Attending', "Associate's"),
+    ('S8', 'Withdrew', 'Certificate'), # Certificate and Withdrew
+    ('S8', 'Matriculating', 'Trade/Vocational'),
+    ('S9', 'Graduated', "Bachelor's"),
+    ('S9', None, "Bachelor's"),
+    ('S9', 'Transferred out', "Associate's"),
+    ('S1', 'Did not matriculate', None),
+    ('S2', 'Withdrew', 'Employment'),
+]
+NSC_ROWS = [
+    ('S1', 'Graduated', "Bachelor's"),
+]
+
+def _table(rows, from_db):
+    header = em.get_enr_field_list(from_db) + ['Index']
+    data = [header]
+    for i, (student, status, degree_type) in enumerate(rows):
+        row = [student, 'C1', START, END, None, status, degree_type,
+               'NSC', None, None]
+        if from_db:
+            row.extend(['E%02d' % i, None, None])
+        row.append(i)
+        data.append(row)
+    return tc.Table(data)
+
+def reference_db_only(db_only, db_only_cases, db_enr_map, match_table):
+    '''The original db only pass: each case in turn scans the remaining
+    records from last to first, taking every one it matches'''
+    db_only = list(db_only)
+    for case in db_only_cases:
+        for i in reversed(range(len(db_only))):
+            if case.comp(db_only[i]):
+                row = db_only.pop(i)
+                db_enr_map[row.index] = [case, None]
+                match_table.append(em.MatchRow(case, db=row))
+
+def _summary(db_enr_map, match_table):
+    '''Case names and records, so results from separate runs compare'''
+    return ({index: [repr(case), other]
+                for index, (case, other) in db_enr_map.items()},
+            [[repr(mr.case)] + mr.to_list()[1:] for mr in match_table])
+
+def test_db_only_pass_matches_reference():
+    db_enr = _table(DB_ROWS, True)
+    nsc_enr = _table(NSC_ROWS, False)
+    db_enr_map, nsc_enr_map, match_table = em.find_matches(db_enr, nsc_enr)
+
+    # Rebuild the state before the db only pass and rerun it the old way
+    db_only_names = {repr(case) for case in em.build_db_only_cases()}
+    ref_map = {index: value for index, value in db_enr_map.items()
+                if repr(value[0]) not in db_only_names}
+    ref_table = [mr for mr in match_table
+                    if repr(mr.case) not in db_only_names]
+    assert len(ref_map) == 1 and len(ref_table) == 1 # the NSC match
+    db_only = [em.DBEnrollment(row) for row in db_enr.rows()
+                if row[-1] not in ref_map]
+    reference_db_only(db_only, em.build_db_only_cases(), ref_map, ref_table)
+
+    assert _summary(db_enr_map, match_table) == \
+            _summary(ref_map, ref_table)
+    assert list(db_enr_map) == list(ref_map)
+    # every case was used and only the 'Deferred' row is left out
+    assert {repr(mr.case) for mr in match_table} >= db_only_names
+    assert sorted(db_enr_map) == [i for i in range(len(DB_ROWS)) if i != 7]
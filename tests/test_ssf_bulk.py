@@ -0,0 +1,96 @@
+'''
+Offline tests for the Bulk API 2.0 export (ssf.iterBulkQuery and the
+BackupAll -bulk path). A fake bulk2 handler stands in for Salesforce and
+hands back the query results as CSV chunks, the way simple_salesforce does
+'''
+import csv
+import os
+
+from botutils.ADB import ssf
+from botutils.ADB import ssfBackup
+
+HEADER = 'Id,Name,Notes,Amount__c\n'
+CHUNKS = [HEADER +
+          '001A,Alpha,"Line one\nline two",5\n'
+          '001B,"Beta, Inc.",,\n',
+          '', # an empty chunk is skipped
+          HEADER +
+          '001C,"Say ""hi""",Plain,7.5\n']
+
+class FakeObject():
+    '''Stands in for sf.Contact (name and describe are all ssf uses)'''
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def describe(self):
+        return {'fields': [{'name': f, 'type': 'string'} for f in self.fields]
+                + [{'name': 'MailingAddress', 'type': 'address'}]}
+
+class FakeBulkType():
+    '''Stands in for sf.bulk2.<object>: query yields the chunks'''
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = []
+
+    def query(self, querytext, max_records=None):
+        self.calls.append((querytext, max_records))
+        for chunk in self.chunks:
+            yield chunk
+
+class FakeBulk2():
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.types = {}
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return self.types.setdefault(name, FakeBulkType(self.chunks))
+
+class FakeSF():
+    def __init__(self, chunks=CHUNKS):
+        self.bulk2 = FakeBulk2(chunks)
+        self.Contact = FakeObject('Contact',
+                                  ['Id', 'Name', 'Notes', 'Amount__c'])
+
+def test_header_then_rows_across_chunks():
+    sf = FakeSF()
+    rows = list(ssf.iterBulkQuery(sf, sf.Contact, 'SELECT Id FROM Contact'))
+    assert rows == [['Id', 'Name', 'Notes', 'Amount__c'],
+                    ['001A', 'Alpha', 'Line one\nline two', '5'],
+                    ['001B', 'Beta, Inc.', None, None],
+                    ['001C', 'Say "hi"', 'Plain', '7.5']]
+    assert sf.bulk2.Contact.calls == [('SELECT Id FROM Contact',
+                                       ssf.BULK_CHUNK_SIZE)]
+
+def test_no_records():
+    sf = FakeSF(['', ''])
+    rows = list(ssf.iterBulkQuery(sf, sf.Contact, 'SELECT Id FROM Contact'))
+    assert rows == []
+
+def test_get_specific_bulk():
+    sf = FakeSF()
+    table = ssf.getSpecific(sf, sf.Contact, ['Id', 'Name'], "Name != ''",
+                            bulk=True)
+    assert [row[:2] for row in table] == [['Id', 'Name'],
+                                          ['001A', 'Alpha'],
+                                          ['001B', 'Beta, Inc.'],
+                                          ['001C', 'Say "hi"']]
+    assert sf.bulk2.Contact.calls[0][0] == \
+            "SELECT Id, Name FROM Contact WHERE Name != ''"
+
+def test_backup_object_bulk(tmp_path):
+    sf = FakeSF()
+    fn = os.path.join(str(tmp_path), 'Contact_test.csv')
+    result = ssfBackup.backup_object(sf, 'Contact', fn, bulk=True)
+    assert result[:2] == ['Contact', 3]
+    # compound fields (MailingAddress) are left out of bulk queries
+    assert sf.bulk2.Contact.calls[0][0] == \
+            'SELECT Id, Name, Notes, Amount__c FROM Contact'
+    with open(fn, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['Id', 'Name', 'Notes', 'Amount__c']
+    assert rows[1] == ['001A', 'Alpha', 'Line one\nline two', '5']
+    assert rows[2] == ['001B', 'Beta, Inc.', '', '']
+    assert rows[3] == ['001C', 'Say "hi"', 'Plain', '7.5']
@@ -0,0 +1,64 @@
+'''
+Tests for the load journal in ssfLoader, including journals left behind
+by a run that died partway through writing a line
+'''
+import json
+
+from botutils.ADB import ssfLoader
+
+A = {'Id': 'a01A', 'Status__c': 'Graduated'}
+B = {'Id': 'a01B', 'Status__c': 'Withdrew'}
+C = {'Id': 'a01C', 'Status__c': 'Attending'}
+
+def _journal(tmp_path, source='abc'):
+    return ssfLoader.Journal(str(tmp_path / 'load.journal'), source)
+
+def test_reload_keeps_accepted(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record([A])
+    journal.record([B])
+    journal = _journal(tmp_path)
+    assert journal.is_accepted(A) and journal.is_accepted(B)
+    assert not journal.is_accepted(C)
+    assert not journal.is_accepted(dict(A, Status__c='Attending'))
+
+def test_different_source_starts_fresh(tmp_path):
+    _journal(tmp_path).record([A])
+    journal = _journal(tmp_path, 'xyz')
+    assert journal.accepted == {}
+    assert _journal(tmp_path, 'xyz').accepted == {}
+
+def test_bad_header_starts_fresh(tmp_path):
+    (tmp_path / 'load.journal').write_text('{"sour')
+    journal = _journal(tmp_path)
+    assert journal.accepted == {}
+    journal.record([A])
+    assert _journal(tmp_path).is_accepted(A)
+
+def test_half_written_last_line(tmp_path, capsys):
+    journal = _journal(tmp_path)
+    journal.record([A])
+    journal.record([B])
+    fn = tmp_path / 'load.journal'
+    text = fn.read_text()
+    fn.write_text(text + '{"time": "2020-01-01 00:00:00", "accepted": {"a0')
+    journal = _journal(tmp_path)
+    assert 'line 4' in capsys.readouterr().err
+    assert journal.is_accepted(A) and journal.is_accepted(B)
+    assert fn.read_text() == text # cut back to the last complete line
+    journal.record([C])
+    journal = _journal(tmp_path)
+    assert all(journal.is_accepted(r) for r in [A, B, C])
+    assert capsys.readouterr().err == ''
+
+def test_bad_line_in_the_middle(tmp_path, capsys):
+    journal = _journal(tmp_path)
+    journal.record([A])
+    fn = tmp_path / 'load.journal'
+    with open(str(fn), 'a') as f:
+        f.write('not json\n')
+        f.write(json.dumps({'accepted': {C['Id']: ssfLoader.payload_hash(C)}})
+                + '\n')
+    journal = _journal(tmp_path)
+    assert 'line 3' in capsys.readouterr().err
+    assert journal.is_accepted(A) and journal.is_accepted(C)
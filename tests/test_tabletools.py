@@ -0,0 +1,31 @@
+'''
+Tests for the typed csv reading in tabletools (iter_csv_chunks)
+'''
+from datetime import date
+
+import pytest
+
+from botutils.tabletools import tabletools as tt
+
+def _write(tmp_path, text):
+    fn = tmp_path / 'data.csv'
+    fn.write_text(text)
+    return str(fn)
+
+def test_dates_and_numbers(tmp_path):
+    fn = _write(tmp_path, 'Id,Start,GPA\n'
+                          'a,2020-08-15,3.5\n'
+                          'b,08/15/2020,\n'
+                          'c,2020-08-15T00:00:00.000Z,2\n')
+    chunks = list(tt.iter_csv_chunks(fn, {'Start': 'date', 'GPA': 'float'},
+                                     chunk_size=2))
+    assert chunks == [[['Id', 'Start', 'GPA']],
+                      [['a', date(2020, 8, 15), 3.5],
+                       ['b', date(2020, 8, 15), None]],
+                      [['c', date(2020, 8, 15), 2.0]]]
+
+@pytest.mark.parametrize('value', ['2020', '8/1', 'soon'])
+def test_bad_date_names_the_column(tmp_path, value):
+    fn = _write(tmp_path, 'Id,Start\na,%s\n' % value)
+    with pytest.raises(Exception, match='Bad value in column Start'):
+        list(tt.iter_csv_chunks(fn, {'Start': 'date'}))
@@ -2,62 +2,73 @@
 '''
 This module updates the named fields in an enrollments csv
 '''
-import datetime
-import sys
+import argparse
+import os
+import time
 
 import pandas as pd
 
 from botutils.ADB import ssf
+from botutils.ADB import ssfLoader
 
-def _clean_str(x):
-    """Function to give a clean string for the xml upload"""
-    if isinstance(x, datetime.datetime):
-        if pd.isnull(x):
-            return 'null_date'
+DATE_FIELDS = ['Start_Date__c','End_Date__c','Date_Last_Verified__c']
+
+def build_columns(update_df):
+    """Function to give the clean upload values for each column at once:
+    dates are formatted as text and blank cells clear the field"""
+    columns = []
+    for field in update_df.columns:
+        col = update_df[field]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            values = col.dt.strftime('%Y-%m-%d')
         else:
-            return x.strftime('%Y-%m-%d')
-    elif pd.isnull(x):
-        return ''
-    else:
-        return x
-
-print(len(sys.argv))
-if len(sys.argv) != 2:
-    print('Usage: {} enrollment_update.csv'.format(sys.argv[0]))
-    print('Assumes the enrollment id has Id as header')
-    sys.exit(1)
+            values = col.astype(object) # so tolist gives native types
+        values = values.where(col.notna(), ssfLoader.NULL_VALUE)
+        columns.append((field, values.tolist()))
+    return columns
+
+def iter_payload(update_df):
+    """Generator of the record dicts for the bulk update, built row by row
+    from the columns prepared by build_columns"""
+    columns = build_columns(update_df)
+    fields = [field for field, values in columns]
+    for Id, row in zip(update_df.index.tolist(),
+                       zip(*[values for field, values in columns])):
+        this_row = {'Id':Id}
+        this_row.update(zip(fields, row))
+        yield this_row
+
+parser = argparse.ArgumentParser(description='Updates enrollments in bulk')
+parser.add_argument('csv', help='enrollment_update.csv (assumes the '+
+                                'enrollment id has Id as header)')
+parser.add_argument('-batchsize', dest='batchsize', type=int,
+        default=ssfLoader.DEFAULT_BATCH_SIZE, help='Records per bulk batch')
+parser.add_argument('-workers', dest='workers', type=int,
+        default=ssfLoader.DEFAULT_WORKERS,
+        help='Number of batches to run at the same time')
+parser.add_argument('-restart', dest='restart', action='store_true',
+        help='Ignore the journal of any earlier run and send every record')
+args = parser.parse_args()
 
 # Load the input file and convert to xml for bulk update
-update_df = pd.read_csv(sys.argv[1],index_col=0,
-        parse_dates=['Start_Date__c','End_Date__c','Date_Last_Verified__c'])
-
-data = []
-null_data = []
-for Id, vals in update_df.iterrows():
-    this_row = {'Id':Id}
-    fields_to_null = []
-    for x in vals.index:
-        new_data = _clean_str(vals[x])
-        if new_data == 'null_date':
-            fields_to_null.append(x)
-        else:
-            this_row[x] = new_data
+update_df = pd.read_csv(args.csv,index_col=0,
+        parse_dates=DATE_FIELDS)
+print('%d enrollments to update' % len(update_df))
 
-    if fields_to_null:
-        # No fieldsToNull in sObject
-        # 1) check spelling?
-        # 2) push whole thing to non-bulk api?
-        null_data.append([Id, {'fieldsToNull':fields_to_null}])
-    data.append(this_row)
-print(data)
-print(null_data)
+# The journal of accepted Ids lets a rerun resume where a failed run stopped
+# (it is tied to the contents of the csv, so a new file of the same name
+# starts a new journal)
+journal_fn = args.csv + '.journal'
+if args.restart and os.path.exists(journal_fn):
+    os.remove(journal_fn)
+journal = ssfLoader.Journal(journal_fn, ssfLoader.file_hash(args.csv))
 
 # Now push to SF
 sf = ssf.getSF()
-response = sf.bulk.Enrollment__c.update(data)
+start = time.perf_counter()
+response, batches = ssfLoader.bulk_update(sf, 'Enrollment__c',
+                                          iter_payload(update_df),
+                                          args.batchsize, args.workers,
+                                          journal)
+ssfLoader.print_summary(batches, time.perf_counter() - start)
 (pd.DataFrame(response)).to_csv('upload_response.csv')
-null_response = []
-for Id, null_dict in null_data:
-    null_response.append(sf.Enrollment__c.update(Id, null_dict))
-if null_response:
-    (pd.DataFrame(null_response)).to_csv('null_response.csv')